@@ -3,6 +3,9 @@
 class Node:
     """Node in a binary tree `Tree`"""
 
+    # No per-node __dict__, which saves memory and speeds up attribute access
+    __slots__ = ("key", "left", "right", "parent")
+
     def __init__(self, key, left=None, right=None, parent=None):
         self.key = key
         self.left = left
@@ -15,6 +18,23 @@ class Tree:
     def __init__(self, root=None):
         self.root = root
 
+    @classmethod
+    def from_sorted(cls, keys):
+        """Build a balanced tree of the given strictly increasing keys in linear time."""
+        keys = list(keys)
+        assert all(keys[i] < keys[i+1] for i in range(len(keys) - 1)), "Keys must be strictly increasing"
+
+        def build(lo, hi, parent):
+            if lo >= hi:
+                return None
+            mid = (lo + hi) // 2
+            node = Node(keys[mid], parent=parent)
+            node.left = build(lo, mid, node)
+            node.right = build(mid + 1, hi, node)
+            return node
+
+        return cls(build(0, len(keys), None))
+
     def insert(self, key):
         """Insert key into the tree.
 
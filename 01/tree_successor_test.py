@@ -14,9 +14,36 @@ def test_sequence(sequence):
         node = tree.successor(node)
     assert node is None, "Expected no successor, got {}".format(node.key)
 
+def test_from_sorted(n):
+    tree = tree_successor.Tree.from_sorted(range(n))
+
+    def height(node):
+        if node is None:
+            return 0
+        for child in [node.left, node.right]:
+            assert child is None or child.parent is node, "Broken parent pointer"
+        return 1 + max(height(node.left), height(node.right))
+    assert height(tree.root) <= n.bit_length(), "Tree built from sorted keys is not balanced"
+
+    node = tree.successor(None)
+    for element in range(n):
+        assert node is not None and node.key == element, "Expected successor {}".format(element)
+        node = tree.successor(node)
+    assert node is None, "Expected no successor, got {}".format(node.key)
+
+    tree.insert(n + 1)
+    assert tree.successor(tree.successor(None)).key == 1, "Tree built from sorted keys breaks insert"
+    assert tree_successor.Tree.from_sorted([]).root is None, "Tree built from no keys is not empty"
+
+def test_slots():
+    node = tree_successor.Node(1)
+    assert not hasattr(node, "__dict__"), "Node should not have a per-instance __dict__"
+
 tests = [
     ("path", lambda: test_sequence(range(3000))),
     ("random_tree", lambda: test_sequence([pow(997, i, 199999) for i in range(1, 199999)])),
+    ("slots", test_slots),
+    ("from_sorted", lambda: test_from_sorted(100000)),
 ]
 
 if __name__ == "__main__":
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+from array import array
+
+# Index of a missing node. Slot 0 of the arrays is reserved for it, so
+# indices of real nodes are positive and always true.
+NIL = 0
+
+class Tree:
+    """A splay tree whose nodes live in parallel arrays.
+
+    Node i has the key key[i], children left[i] and right[i] and parent
+    parent[i], where missing nodes are NIL. Nodes are referred to by their
+    indices, so lookup returns an index instead of a `Node`. Real nodes start
+    at index 1. Slots of removed nodes are kept in a free list and reused by
+    later inserts.
+
+    Keys must be integers fitting in 64 bits. Operations restructure
+    the tree exactly as `splay_operation.Tree` does.
+    """
+
+    def __init__(self):
+        self.root = NIL
+        self.key = array('q', [0])
+        self.left = array('i', [NIL])
+        self.right = array('i', [NIL])
+        self.parent = array('i', [NIL])
+        self.free = []
+
+    def _new_node(self, key, parent):
+        """Create a leaf with the given key and parent, returning its index."""
+        if self.free:
+            node = self.free.pop()
+            self.key[node] = key
+            self.left[node] = self.right[node] = NIL
+            self.parent[node] = parent
+        else:
+            node = len(self.key)
+            self.key.append(key)
+            self.left.append(NIL)
+            self.right.append(NIL)
+            self.parent.append(parent)
+        return node
+
+    def copy(self):
+        """Return an independent copy of the tree, copying the arrays as whole."""
+        tree = Tree()
+        tree.root = self.root
+        tree.key = self.key[:]
+        tree.left = self.left[:]
+        tree.right = self.right[:]
+        tree.parent = self.parent[:]
+        tree.free = self.free[:]
+        return tree
+
+    def rotate(self, node):
+        """ Rotate the given `node` up.
+
+        Performs a single rotation of the edge between the given node
+        and its parent, choosing left or right rotation appropriately.
+        """
+        left, right, parent = self.left, self.right, self.parent
+        p = parent[node]
+        if p == NIL:
+            return
+        if left[p] == node:
+            if right[node] != NIL: parent[right[node]] = p
+            left[p] = right[node]
+            right[node] = p
+        else:
+            if left[node] != NIL: parent[left[node]] = p
+            right[p] = left[node]
+            left[node] = p
+        g = parent[p]
+        if g != NIL:
+            if left[g] == p:
+                left[g] = node
+            else:
+                right[g] = node
+        else:
+            self.root = node
+        parent[p], parent[node] = node, g
+
+    def lookup(self, key):
+        """Look up the given key in the tree.
+
+        Returns the index of the node with the requested key, which is
+        always positive, or `None`.
+        """
+        keys, left, right = self.key, self.left, self.right
+        node = self.root
+        while node != NIL:
+            if keys[node] == key:
+                self.splay(node)
+                return node
+            if key < keys[node]:
+                if left[node] == NIL:
+                    self.splay(node)
+                    return None
+                node = left[node]
+            else:
+                if right[node] == NIL:
+                    self.splay(node)
+                    return None
+                node = right[node]
+
+        return None
+
+    def insert(self, key):
+        """Insert key into the tree.
+
+        If the key is already present, nothing happens.
+        """
+        if self.root == NIL:
+            self.root = self._new_node(key, NIL)
+            return
+
+        keys, left, right = self.key, self.left, self.right
+        node = self.root
+        while keys[node] != key:
+            if key < keys[node]:
+                if left[node] == NIL:
+                    left[node] = self._new_node(key, node)
+                node = left[node]
+            else:
+                if right[node] == NIL:
+                    right[node] = self._new_node(key, node)
+                node = right[node]
+
+        self.splay(node)
+
+    def remove(self, key):
+        """Remove given key from the tree.
+
+        It the key is not present, nothing happens.
+        """
+        node = self.lookup(key)
+        if node is None:
+            return
+
+        left, right, parent = self.left, self.right, self.parent
+        if left[node] != NIL and right[node] != NIL:
+            # Move the key of the leftmost node of the right subtree here
+            # and remove that node instead
+            replacement = right[node]
+            while left[replacement] != NIL:
+                replacement = left[replacement]
+            self.key[node] = self.key[replacement]
+            node = replacement
+
+        replacement = left[node] if left[node] != NIL else right[node]
+        p = parent[node]
+        if p != NIL:
+            if left[p] == node: left[p] = replacement
+            else: right[p] = replacement
+        else:
+            self.root = replacement
+        if replacement != NIL:
+            parent[replacement] = p
+        self.free.append(node)
+        self.splay(p)
+
+    def splay(self, node):
+        """Splay the given node.
+
+        If a single rotation needs to be performed, perform it as the last rotation
+        (i.e., to move the splayed node to the root of the tree).
+        """
+        if node is None or node == NIL:
+            return
+
+        left, right, parent = self.left, self.right, self.parent
+        while node != self.root:
+            p = parent[node]
+            # Zig case: if there is no grandparent, we just do a simple rotation.
+            if p == self.root:
+                self.rotate(node)
+                break
+            g = parent[p]
+            if (right[p] == node) == (right[g] == p):
+                # Zig-zig case
+                self.rotate(p)
+                self.rotate(node)
+            else:
+                # Zig-zag case
+                self.rotate(node)
+                self.rotate(node)
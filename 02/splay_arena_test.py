@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+import sys
+
+import splay_arena
+import splay_operation
+
+def serialize(tree):
+    """Serialize a pointer-based tree or an arena tree to nested tuples."""
+    if isinstance(tree, splay_arena.Tree):
+        def node(i):
+            if i == splay_arena.NIL:
+                return None
+            assert tree.left[i] == splay_arena.NIL or tree.parent[tree.left[i]] == i, "Broken parent index"
+            assert tree.right[i] == splay_arena.NIL or tree.parent[tree.right[i]] == i, "Broken parent index"
+            return (tree.key[i], node(tree.left[i]), node(tree.right[i]))
+    else:
+        def node(n):
+            if n is None:
+                return None
+            return (n.key, node(n.left), node(n.right))
+    return node(tree.root)
+
+def test_same_shape():
+    sys.setrecursionlimit(10000)
+    arena, tree = splay_arena.Tree(), splay_operation.Tree()
+    sequence = [pow(997, i, 1999) for i in range(1, 1999)]
+
+    for elem in sequence:
+        arena.insert(elem)
+        tree.insert(elem)
+    assert serialize(arena) == serialize(tree), "Different tree after inserts"
+
+    for elem in sequence[::7]:
+        found = arena.lookup(elem)
+        assert found is not None and arena.key[found] == elem, "Existing element was not found"
+        tree.lookup(elem)
+    for elem in range(2000, 2100):
+        assert arena.lookup(elem) is None, "Non-existing element was found"
+        tree.lookup(elem)
+    assert serialize(arena) == serialize(tree), "Different tree after lookups"
+
+    for elem in sequence[::3]:
+        arena.remove(elem)
+        tree.remove(elem)
+    assert serialize(arena) == serialize(tree), "Different tree after removes"
+
+def test_free_list():
+    tree = splay_arena.Tree()
+    for elem in range(1000):
+        tree.insert(elem)
+    for elem in range(0, 1000, 2):
+        tree.remove(elem)
+    for elem in range(1000, 1500):
+        tree.insert(elem)
+    assert len(tree.key) == 1001, "Slots of removed nodes were not reused"
+    for elem in range(1500):
+        found = tree.lookup(elem) is not None
+        assert found == (elem % 2 == 1 or elem >= 1000), "Wrong result of lookup of {}".format(elem)
+
+def test_first_node():
+    tree = splay_arena.Tree()
+    tree.insert(42)
+    found = tree.lookup(42)
+    assert found and tree.key[found] == 42, "First node has a false index"
+    tree.remove(42)
+    assert tree.root == splay_arena.NIL, "Tree is not empty after removing its only key"
+    tree.insert(7)
+    assert tree.lookup(7), "Reused slot has a false index"
+
+def test_copy():
+    tree = splay_arena.Tree()
+    for elem in range(100):
+        tree.insert(elem)
+    snapshot = tree.copy()
+    before = serialize(snapshot)
+    for elem in range(50):
+        tree.remove(elem)
+    tree.insert(1000)
+    assert serialize(snapshot) == before, "Snapshot changed together with the tree"
+    assert all(snapshot.lookup(elem) is not None for elem in range(100)), "Snapshot lost a key"
+
+def test_speed():
+    tree = splay_arena.Tree()
+    for elem in range(200000):
+        for _ in range(10):
+            tree.insert(elem)
+    for elem in range(0, 200000, 2):
+        tree.remove(elem)
+    for elem in range(200000):
+        tree.lookup(elem)
+
+tests = [
+    ("same_shape", test_same_shape),
+    ("free_list", test_free_list),
+    ("first_node", test_first_node),
+    ("copy", test_copy),
+    ("speed", test_speed),
+]
+
+if __name__ == "__main__":
+    for required_test in sys.argv[1:] or [name for name, _ in tests]:
+        for name, test in tests:
+            if name == required_test:
+                print("Running test {}".format(name), file=sys.stderr)
+                test()
+                break
+        else:
+            raise ValueError("Unknown test {}".format(name))
@@ -127,11 +127,120 @@ def test_remove():
     for elem in range(2, 100000, 2):
         tree.remove(elem)
 
+def inorder(tree):
+    """List keys of given tree in ascending order, without using parent pointers."""
+    keys, stack, node = [], [], tree.root
+    while stack or node is not None:
+        if node is not None:
+            stack.append(node)
+            node = node.left
+        else:
+            node = stack.pop()
+            keys.append(node.key)
+            node = node.right
+    return keys
+
+def test_top_down():
+    tree = Tree(top_down=True)
+    sequence = [pow(997, i, 1999) for i in range(1, 1999)]
+    for elem in sequence:
+        tree.insert(elem)
+        assert tree.root.key == elem, "Inserted key should be at the root"
+    assert inorder(tree) == sorted(sequence), "Incorrect tree after a sequence of inserts"
+
+    for elem in range(0, 2000):
+        node = tree.lookup(elem)
+        assert (node is not None) == (1 <= elem <= 1998), "Wrong result of lookup of {}".format(elem)
+        assert node is None or node is tree.root, "Found key should be at the root"
+
+    for elem in sequence[::2]:
+        tree.remove(elem)
+    tree.remove(5000)
+    assert inorder(tree) == sorted(sequence[1::2]), "Incorrect tree after a sequence of removes"
+
+    # Test speed
+    tree = Tree(top_down=True)
+    for elem in range(200000):
+        for _ in range(10):
+            tree.insert(elem)
+    for elem in range(0, 200000, 2):
+        tree.remove(elem)
+    for elem in range(200000):
+        tree.lookup(elem)
+
+def test_from_sorted():
+    n = 100000
+    for top_down in [False, True]:
+        tree = Tree.from_sorted(range(0, 2 * n, 2), top_down=top_down)
+        assert inorder(tree) == list(range(0, 2 * n, 2)), "Incorrect tree built from sorted keys"
+
+        depth, node = 0, tree.root
+        while node is not None:
+            depth, node = depth + 1, node.left
+        assert depth <= n.bit_length(), "Tree built from sorted keys is not balanced"
+
+        for elem in range(2 * n):
+            assert (tree.lookup(elem) is not None) == (elem % 2 == 0), "Wrong result of lookup of {}".format(elem)
+        tree.insert(1)
+        tree.remove(0)
+        assert inorder(tree)[:2] == [1, 2], "Tree built from sorted keys breaks insert or remove"
+    assert flatten(Tree.from_sorted(range(100))) == list(range(100)), "Broken parent pointers"
+
+def test_split_join():
+    n = 2000
+    sequence = [pow(997, i, 1999) for i in range(1, 1999)]
+    for top_down in [False, True]:
+        tree = Tree(top_down=top_down)
+        for elem in sequence:
+            tree.insert(elem)
+
+        # Split to small parts and join them back
+        parts = []
+        for key in range(n, 0, -100):
+            tree, right = tree.split(key)
+            parts.append(right)
+        parts.append(tree)
+        for part, key in zip(reversed(parts), range(100, n + 200, 100)):
+            assert all(key - 100 <= k < key for k in inorder(part)), "Split tree has keys out of range"
+
+        tree = Tree(top_down=top_down)
+        for part in reversed(parts):
+            tree.join(part)
+            assert part.root is None, "Joined tree was not emptied"
+        assert inorder(tree) == sorted(sequence), "Incorrect tree after splits and joins"
+        if not top_down:
+            assert flatten(tree) == sorted(sequence), "Broken parent pointers after splits and joins"
+
+        for elem in sequence[::2]:
+            tree.remove(elem)
+        assert inorder(tree) == sorted(sequence[1::2]), "Incorrect tree after removes from a joined tree"
+
+        # Splitting by a missing key or beyond the ends
+        for key in [0, 5000, 1001]:
+            left, right = Tree.from_sorted(range(0, n, 2), top_down=top_down).split(key)
+            assert inorder(left) == list(range(0, min(key, n), 2)), "Incorrect left tree of split"
+            assert inorder(right) == list(range(min(key + key % 2, n), n, 2)), "Incorrect right tree of split"
+
+    # Test speed
+    tree = Tree.from_sorted(range(200000))
+    for i in range(1, 20000):
+        left, right = tree.split(pow(997, i, 199999))
+        left.join(right)
+        tree = left
+
+def test_slots():
+    node = Node(1)
+    assert not hasattr(node, "__dict__"), "Node should not have a per-instance __dict__"
+
 tests = [
     ("splay", test_splay),
     ("lookup", test_lookup),
     ("insert", test_insert),
     ("remove", test_remove),
+    ("slots", test_slots),
+    ("top_down", test_top_down),
+    ("from_sorted", test_from_sorted),
+    ("split_join", test_split_join),
 ]
 
 if __name__ == "__main__":
@@ -11,14 +11,18 @@ class BenchmarkingTree(Tree):
     We inherit the implementation of operations from the Tree class
     and extend it by keeping statistics on the number of splay operations
     and the total number of rotations. Also, if naive is turned on,
-    splay uses only single rotations.
+    splay uses only single rotations, and if top_down is turned on,
+    operations splay top-down.
     """
 
-    def __init__(self, naive=False):
-        Tree.__init__(self)
+    def __init__(self, naive=False, top_down=False):
+        Tree.__init__(self, top_down=top_down)
         self.do_naive = naive
         self.reset()
 
+    def _empty_like(self):
+        return BenchmarkingTree(naive=self.do_naive, top_down=self.top_down)
+
     def reset(self):
         """Reset statistics."""
         self.num_rotations = 0;
@@ -36,6 +40,12 @@ class BenchmarkingTree(Tree):
         else:
             Tree.splay(self, node)
 
+    def _splay_top_down(self, key):
+        self.num_operations += 1
+        rotations = Tree._splay_top_down(self, key)
+        self.num_rotations += rotations
+        return rotations
+
     def rot_per_op(self):
         """Return the average number of rotations per operation."""
         if self.num_operations > 0:
@@ -45,7 +55,7 @@ class BenchmarkingTree(Tree):
 
 def test_sequential():
     for n in range(100, 3001, 100):
-        tree = BenchmarkingTree(naive)
+        tree = BenchmarkingTree(naive, top_down)
         for elem in range(n):
             tree.insert(elem)
 
@@ -58,7 +68,7 @@ def test_sequential():
 def test_random():
     for exp in range(32, 64):
         n = int(2**(exp/4))
-        tree = BenchmarkingTree(naive)
+        tree = BenchmarkingTree(naive, top_down)
 
         for elem in random.sample(range(n), n):
             tree.insert(elem)
@@ -94,7 +104,7 @@ def test_subset():
             make_progression(seq, 3*n//4, 3*n//4 + n//20, n//2, -4)
             make_progression(seq, 17*n//20, 17*n//20 + n//20, 2*n//5, 5)
 
-            tree = BenchmarkingTree(naive)
+            tree = BenchmarkingTree(naive, top_down)
             for elem in seq:
                 tree.insert(elem)
             tree.reset()
@@ -110,18 +120,23 @@ tests = {
     "subset": test_subset,
 }
 
-if len(sys.argv) == 4:
-    test, student_id = sys.argv[1], sys.argv[2]
-    if sys.argv[3] == "std":
-        naive = False
-    elif sys.argv[3] == "naive":
-        naive = True
-    else:
-        raise ValueError("Last argument must be either 'std' or 'naive'")
-    random.seed(student_id)
-    if test in tests:
-        tests[test]()
+if __name__ == "__main__":
+    if len(sys.argv) == 4:
+        test, student_id = sys.argv[1], sys.argv[2]
+        top_down = False
+        if sys.argv[3] == "std":
+            naive = False
+        elif sys.argv[3] == "naive":
+            naive = True
+        elif sys.argv[3] == "topdown":
+            naive = False
+            top_down = True
+        else:
+            raise ValueError("Last argument must be either 'std', 'naive' or 'topdown'")
+        random.seed(student_id)
+        if test in tests:
+            tests[test]()
+        else:
+            raise ValueError("Unknown test {}".format(test))
     else:
-        raise ValueError("Unknown test {}".format(test))
-else:
-    raise ValueError("Usage: {} <test> <student-id> (std|naive)".format(sys.argv[0]))
+        raise ValueError("Usage: {} <test> <student-id> (std|naive|topdown)".format(sys.argv[0]))
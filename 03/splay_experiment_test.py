@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+import sys
+
+from splay_experiment import BenchmarkingTree
+
+def inorder(tree):
+    """List keys of given tree in ascending order, without using parent pointers."""
+    keys, stack, node = [], [], tree.root
+    while stack or node is not None:
+        if node is not None:
+            stack.append(node)
+            node = node.left
+        else:
+            node = stack.pop()
+            keys.append(node.key)
+            node = node.right
+    return keys
+
+def test_from_sorted():
+    for top_down in [False, True]:
+        tree = BenchmarkingTree.from_sorted(range(1000), top_down=top_down)
+        assert isinstance(tree, BenchmarkingTree), "from_sorted did not build a BenchmarkingTree"
+        assert tree.do_naive is False and tree.top_down == top_down, "from_sorted did not keep the mode"
+        assert inorder(tree) == list(range(1000)), "Incorrect tree built from sorted keys"
+
+        for elem in range(1000):
+            assert tree.lookup(elem) is not None, "Existing element was not found"
+        assert tree.num_operations >= 1000 and tree.num_rotations > 0, "Operations were not counted"
+
+def test_split_join():
+    for naive in [False, True]:
+        tree = BenchmarkingTree.from_sorted(range(1000))
+        tree.do_naive = naive
+        left, right = tree.split(500)
+        for part in [left, right]:
+            assert isinstance(part, BenchmarkingTree), "split did not build BenchmarkingTrees"
+            assert part.do_naive == naive, "split did not keep the mode"
+        assert inorder(left) == list(range(500)) and inorder(right) == list(range(500, 1000)), \
+            "Incorrect trees after split"
+
+        left.join(right)
+        assert inorder(left) == list(range(1000)), "Incorrect tree after join"
+
+tests = [
+    ("from_sorted", test_from_sorted),
+    ("split_join", test_split_join),
+]
+
+if __name__ == "__main__":
+    for required_test in sys.argv[1:] or [name for name, _ in tests]:
+        for name, test in tests:
+            if name == required_test:
+                print("Running test {}".format(name), file=sys.stderr)
+                test()
+                break
+        else:
+            raise ValueError("Unknown test {}".format(name))
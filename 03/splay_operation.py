@@ -3,6 +3,9 @@
 class Node:
     """Node in a binary tree `Tree`"""
 
+    # No per-node __dict__, which saves memory and speeds up attribute access
+    __slots__ = ("key", "left", "right", "parent")
+
     def __init__(self, key, left=None, right=None, parent=None):
         self.key = key
         self.parent = parent
@@ -12,10 +15,39 @@ class Node:
         if right is not None: right.parent = self
 
 class Tree:
-    """A simple binary search tree"""
+    """A simple binary search tree
+
+    With top_down=True, lookup, insert and remove splay top-down
+    (as described by Sleator and Tarjan): the path to the key is split
+    into a left and a right tree on the way down and they are joined under
+    the found node at the end. It needs a single pass and no parent pointers,
+    which are not kept up to date in this mode, so `splay` and `rotate`
+    must not be used on such a tree.
+    """
 
-    def __init__(self, root=None):
+    def __init__(self, root=None, top_down=False):
         self.root = root
+        self.top_down = top_down
+
+    @classmethod
+    def from_sorted(cls, keys, top_down=False):
+        """Build a balanced tree of the given strictly increasing keys in linear time.
+
+        No splaying is done, every key ends at the middle of its subtree.
+        """
+        keys = list(keys)
+        assert all(keys[i] < keys[i+1] for i in range(len(keys) - 1)), "Keys must be strictly increasing"
+
+        def build(lo, hi):
+            if lo >= hi:
+                return None
+            mid = (lo + hi) // 2
+            return Node(keys[mid], left=build(lo, mid), right=build(mid + 1, hi))
+
+        # Subclasses may take other positional arguments, so the root is set afterwards
+        tree = cls(top_down=top_down)
+        tree.root = build(0, len(keys))
+        return tree
 
     def rotate(self, node):
         """ Rotate the given `node` up.
@@ -46,6 +78,10 @@ class Tree:
 
         Returns the node with the requested key or `None`.
         """
+        if self.top_down:
+            self._splay_top_down(key)
+            return self.root if self.root is not None and self.root.key == key else None
+
         # TODO: Utilize splay suitably.
         node = self.root
         while node is not None:
@@ -70,6 +106,10 @@ class Tree:
 
         If the key is already present, nothing happens.
         """
+        if self.top_down:
+            self._insert_top_down(key)
+            return
+
         # TODO: Utilize splay suitably.
         if self.root is None:
             self.root = Node(key)
@@ -93,6 +133,10 @@ class Tree:
 
         It the key is not present, nothing happens.
         """
+        if self.top_down:
+            self._remove_top_down(key)
+            return
+
         # TODO: Utilize splay suitably.
         node = self.lookup(key)
 
@@ -122,6 +166,71 @@ class Tree:
             self.splay(node.parent)
                 
 
+    def split(self, key):
+        """Split the tree to two trees, of keys smaller than key and of the other keys.
+
+        Returns the two trees, leaving this tree empty.
+        """
+        if self.top_down:
+            self._splay_top_down(key)
+        else:
+            self.lookup(key)
+
+        root, left, right = self.root, None, None
+        if root is not None:
+            if root.key < key:
+                left, right = root, root.right
+                root.right = None
+            else:
+                left, right = root.left, root
+                root.left = None
+        for subtree in [left, right]:
+            if subtree is not None:
+                subtree.parent = None
+
+        self.root = None
+        trees = self._empty_like(), self._empty_like()
+        trees[0].root, trees[1].root = left, right
+        return trees
+
+    def _empty_like(self):
+        """Create an empty tree of the same class, splaying in the same way."""
+        return type(self)(top_down=self.top_down)
+
+    @staticmethod
+    def _leftmost(node):
+        """Return the node with the minimum key in the subtree of the given node."""
+        while node.left is not None:
+            node = node.left
+        return node
+
+    def join(self, other):
+        """Move all keys of other tree to this tree, leaving the other tree empty.
+
+        All keys of the other tree must be greater than all keys of this tree.
+        """
+        assert self.top_down == other.top_down, "Cannot join trees splaying in different ways"
+        if other.root is None:
+            return
+        if self.root is None:
+            self.root, other.root = other.root, None
+            return
+
+        # Splay the maximum, which has no right child then
+        node = self.root
+        while node.right is not None:
+            node = node.right
+        assert node.key < self._leftmost(other.root).key, \
+            "Keys of joined tree must be greater than keys of this tree"
+        if self.top_down:
+            self._splay_top_down(node.key)
+        else:
+            self.splay(node)
+
+        self.root.right = other.root
+        other.root.parent = self.root
+        other.root = None
+
     def splay(self, node):
         """Splay the given node.    
 
@@ -157,3 +266,104 @@ class Tree:
                     self.rotate(node.parent)
                     self.rotate(node)            
         
+
+    def _splay_top_down(self, key):
+        """Splay the node with the given key, or the last node on the way to it, top-down.
+
+        Returns the number of rotations and links performed. Each of them
+        moves the splayed node one level up, like a rotation of bottom-up
+        splaying does, so their number is comparable to bottom-up rotations.
+        """
+        node = self.root
+        if node is None:
+            return 0
+
+        # Nodes smaller than the key hang in the left tree, larger ones
+        # in the right tree; their roots are the right and left child of header.
+        header = Node(None)
+        left_max = right_min = header
+        rotations = 0
+        while True:
+            if key < node.key:
+                if node.left is None:
+                    break
+                if key < node.left.key:
+                    # Zig-zig: rotate right first
+                    child = node.left
+                    node.left = child.right
+                    child.right = node
+                    node = child
+                    rotations += 1
+                    if node.left is None:
+                        break
+                # Link the node as the new minimum of the right tree
+                rotations += 1
+                right_min.left = node
+                right_min = node
+                node = node.left
+            elif key > node.key:
+                if node.right is None:
+                    break
+                if key > node.right.key:
+                    # Zig-zig: rotate left first
+                    child = node.right
+                    node.right = child.left
+                    child.left = node
+                    node = child
+                    rotations += 1
+                    if node.right is None:
+                        break
+                # Link the node as the new maximum of the left tree
+                rotations += 1
+                left_max.right = node
+                left_max = node
+                node = node.right
+            else:
+                break
+
+        # Assemble the left tree, the node and the right tree
+        left_max.right = node.left
+        right_min.left = node.right
+        node.left = header.right
+        node.right = header.left
+        node.parent = None
+        self.root = node
+        return rotations
+
+    def _insert_top_down(self, key):
+        if self.root is None:
+            self.root = Node(key)
+            return
+
+        self._splay_top_down(key)
+        root = self.root
+        if root.key == key:
+            return
+
+        # The new node becomes the root, splitting the old root from one of its subtrees
+        node = Node(key)
+        if key < root.key:
+            node.left = root.left
+            node.right = root
+            root.left = None
+        else:
+            node.right = root.right
+            node.left = root
+            root.right = None
+        self.root = node
+
+    def _remove_top_down(self, key):
+        self._splay_top_down(key)
+        root = self.root
+        if root is None or root.key != key:
+            return
+
+        if root.left is None:
+            self.root = root.right
+        else:
+            # Splaying the left subtree by the removed key brings its maximum
+            # to the root, which has no right child then
+            right = root.right
+            self.root = root.left
+            self._splay_top_down(key)
+            self.root.right = right
@@ -1,5 +1,19 @@
+import hashlib
 import random
 import math
+from array import array
+
+def prehash(key):
+    """Turn a str or bytes key to a 64-bit integer by BLAKE2.
+
+    Integer keys are returned unchanged. Unlike the built-in hash(),
+    the result does not change between runs of Python.
+    """
+    if isinstance(key, str):
+        key = key.encode()
+    if isinstance(key, bytes):
+        return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+    return key
 
 class TabulationHash:
     """Hash function for hashing by tabulation.
@@ -14,6 +28,8 @@ class TabulationHash:
         for i in range(4):
             self.tables[i] = [random.randint(0, 0xffffffff) for _ in range(256)]
         self.num_buckets = num_buckets
+        # The same tables as a contiguous numpy array, built by the first hash_many
+        self.np_tables = None
 
     def hash(self, key):
         h0 = key & 0xff
@@ -23,25 +39,155 @@ class TabulationHash:
         t = self.tables
         return (t[0][h0] ^ t[1][h1] ^ t[2][h2] ^ t[3][h3]) % self.num_buckets
 
+    def hash_many(self, keys):
+        """Hash a whole array (or buffer) of 32-bit keys at once.
+
+        Returns a numpy array of buckets, equal to calling `hash` on each key.
+        """
+        # numpy is needed only for hashing in bulk
+        import numpy
+
+        if self.np_tables is None:
+            self.np_tables = numpy.array(self.tables, dtype=numpy.uint32)
+        keys = numpy.asarray(keys, dtype=numpy.uint32)
+        t = self.np_tables
+        h = t[0][keys & 0xff] ^ t[1][(keys >> 8) & 0xff] ^ \
+            t[2][(keys >> 16) & 0xff] ^ t[3][keys >> 24]
+        return h % self.num_buckets
+
+class CompactTabulationHash:
+    """Hash function for hashing by tabulation with flat tables.
+
+    Works like TabulationHash, but all tables are stored one after another
+    in a single array of 32-bit integers. With chunk_bits=16, the 32-bit key
+    is split to two 16-bit parts, so only two tables (512 kB together)
+    are looked up instead of four.
+    """
+
+    def __init__(self, num_buckets, chunk_bits=8):
+        assert chunk_bits in (8, 16), "CompactTabulationHash: chunks must have 8 or 16 bits"
+        self.chunk_bits = chunk_bits
+        self.num_chunks = 32 // chunk_bits
+        self.table = array('I', (random.getrandbits(32) for _ in range(self.num_chunks << chunk_bits)))
+        self.num_buckets = num_buckets
+        # Pick the hashing method once, not on every call
+        self.hash = self._hash16 if chunk_bits == 16 else self._hash8
+
+    def _hash8(self, key):
+        t = self.table
+        return (t[key & 0xff] ^ t[0x100 + ((key >> 8) & 0xff)] ^
+                t[0x200 + ((key >> 16) & 0xff)] ^ t[0x300 + ((key >> 24) & 0xff)]) % self.num_buckets
+
+    def _hash16(self, key):
+        t = self.table
+        return (t[key & 0xffff] ^ t[0x10000 + ((key >> 16) & 0xffff)]) % self.num_buckets
+
+    def hash_many(self, keys):
+        """Hash a whole array (or buffer) of 32-bit keys at once.
+
+        Returns a numpy array of buckets, equal to calling `hash` on each key.
+        """
+        import numpy
+
+        # A view of the same memory, no copy is made
+        t = numpy.frombuffer(self.table, dtype=numpy.uint32)
+        keys = numpy.asarray(keys, dtype=numpy.uint32)
+        bits, mask = self.chunk_bits, (1 << self.chunk_bits) - 1
+        h = t[keys & mask]
+        for i in range(1, self.num_chunks):
+            h ^= t[(i << bits) + ((keys >> (i * bits)) & mask)]
+        return h % self.num_buckets
+
+class TabulationHash64:
+    """Hash function for hashing 64-bit keys by tabulation.
+
+    The 64-bit key is split to eight 8-bit parts, each indexing its own
+    table of 256 random values. Keys of type str or bytes are first
+    turned to 64-bit integers by `prehash`.
+    """
+
+    def __init__(self, num_buckets):
+        self.tables = [None] * 8
+        for i in range(8):
+            self.tables[i] = [random.randint(0, 0xffffffff) for _ in range(256)]
+        self.num_buckets = num_buckets
+        # The same tables as a contiguous numpy array, built by the first hash_many
+        self.np_tables = None
+
+    def hash(self, key):
+        key = prehash(key)
+        t = self.tables
+        return (t[0][key & 0xff] ^ t[1][(key >> 8) & 0xff] ^
+                t[2][(key >> 16) & 0xff] ^ t[3][(key >> 24) & 0xff] ^
+                t[4][(key >> 32) & 0xff] ^ t[5][(key >> 40) & 0xff] ^
+                t[6][(key >> 48) & 0xff] ^ t[7][(key >> 56) & 0xff]) % self.num_buckets
+
+    def hash_many(self, keys):
+        """Hash a whole array (or buffer) of 64-bit keys at once.
+
+        A list may contain str or bytes keys too. Returns a numpy array
+        of buckets, equal to calling `hash` on each key.
+        """
+        import numpy
+
+        if self.np_tables is None:
+            self.np_tables = numpy.array(self.tables, dtype=numpy.uint32)
+        if not isinstance(keys, numpy.ndarray):
+            keys = [prehash(key) for key in keys]
+        keys = numpy.asarray(keys, dtype=numpy.uint64)
+        t = self.np_tables
+        h = t[0][keys & 0xff]
+        for i in range(1, 8):
+            h ^= t[i][(keys >> (8*i)) & 0xff]
+        return h % self.num_buckets
+
 class CuckooTable:
     """Hash table with Cuckoo hashing.
 
     We have two hash functions, which map 32-bit keys to buckets of a common
-    hash table. Unused buckets contain None.
+    hash table. Unused buckets contain None. Other keys, like 64-bit integers
+    or strings, need another hash_factory, e.g. TabulationHash64.
+
+    Keys for which the eviction loop fails can be kept in a small stash
+    searched by every lookup, so the table is rebuilt only when the stash
+    overflows.
     """
 
-    def __init__(self, num_buckets):
+    # Whether every key has a value stored in a list parallel to the buckets
+    _with_values = False
+
+    # Failed rebuilds with new hash functions before the table doubles instead
+    max_rebuild_attempts = 10
+
+    def __init__(self, num_buckets, max_load=None, stash_size=0, hash_factory=TabulationHash):
         """Initialize the table with the given number of buckets.
-        The number of buckets is expected to stay constant."""
 
+        Without max_load, the number of buckets stays constant, unless
+        the keys cannot be placed at all (see rehash_table). Otherwise,
+        the table doubles whenever more than max_load of its buckets are used.
+        Cuckoo hashing with two functions works well below 0.5; above it,
+        rebuilds keep failing and the table doubles sooner. The stash
+        holds up to stash_size keys. Hash functions are created by calling
+        hash_factory(num_buckets)."""
+
+        assert max_load is None or 0 < max_load < 1, "CuckooTable: max_load must be in (0, 1)"
+        self.max_load = max_load
         self.n = 0
 
         # The array of buckets
         self.num_buckets = num_buckets
         self.table = [None] * num_buckets
+        self.values = [None] * num_buckets if self._with_values else None
+        self.stash_size = stash_size
+        self.stash = []
+        self.stash_values = []
 
         # Create two fresh hash functions
-        self.hashes = [TabulationHash(num_buckets), TabulationHash(num_buckets)]
+        self.hash_factory = hash_factory
+        self.hashes = [hash_factory(num_buckets), hash_factory(num_buckets)]
+
+        # Number of attempts to rebuild the table with new hash functions
+        self.rebuild_attempts = 0
 
     def lookup(self, key):
         """Check if the table contains the given key. Returns True or False."""
@@ -49,55 +195,347 @@ class CuckooTable:
         b0 = self.hashes[0].hash(key)
         b1 = self.hashes[1].hash(key)
         # print("## Lookup key={} b0={} b1={}".format(key, b0, b1))
-        return self.table[b0] == key or self.table[b1] == key
+        return self.table[b0] == key or self.table[b1] == key or key in self.stash
+
+    def lookup_many(self, keys):
+        """Check which of the given keys the table contains.
+
+        Both hash functions are evaluated for all keys at once.
+        Returns a list of True or False.
+        """
+
+        table, stash = self.table, self.stash
+        b0s = self.hashes[0].hash_many(keys).tolist()
+        b1s = self.hashes[1].hash_many(keys).tolist()
+        return [table[b0] == key or table[b1] == key or key in stash for key, b0, b1 in zip(keys, b0s, b1s)]
 
     def insert(self, key):
-        """Insert a new key to the table. Assumes that the key is not present yet."""
+        """Insert a new key to the table. If it is already present, nothing happens."""
+
+        b0 = self.hashes[0].hash(key)
+        b1 = self.hashes[1].hash(key)
+        self._insert_hashed(key, b0, b1)
+
+    def insert_many(self, keys):
+        """Insert all given keys to the table.
+
+        Both hash functions are evaluated for all keys at once. Keys with
+        a free bucket are stored directly and only the rest go through
+        the eviction loop. When the table is rehashed meanwhile, buckets
+        of the remaining keys are computed again.
+        """
+
+        keys = list(keys)
+        i = 0
+        while i < len(keys):
+          hashes = self.hashes
+          b0s = hashes[0].hash_many(keys[i:]).tolist()
+          b1s = hashes[1].hash_many(keys[i:]).tolist()
+          for key, b0, b1 in zip(keys[i:], b0s, b1s):
+            i += 1
+            self._insert_hashed(key, b0, b1)
+            if self.hashes is not hashes:
+              break
+
+    def _insert_hashed(self, key, b0, b1, value=None):
+        """Insert a key whose buckets b0 and b1 are already computed."""
         # If the key is already present in the hashtable, stop insertion method.
-        if self.lookup(key):
+        if self.table[b0] == key or self.table[b1] == key or key in self.stash:
           return
 
         # Increment count of current elements present in the table.
         self.n += 1
 
+        # If the insertion of the element has failed, put the homeless key
+        # to the stash, or rehash the table with it if the stash is full.
+        homeless = self._place(key, b0, b1, value)
+        if homeless is not None:
+          if len(self.stash) < self.stash_size:
+            self.stash.append(homeless[0])
+            self.stash_values.append(homeless[1])
+          else:
+            self.rehash_table(homeless)
+
+        # Grow the table if it is getting too full.
+        if self.max_load is not None and self.n > self.max_load * self.num_buckets:
+          self.resize(2 * self.num_buckets)
+
+    def resize(self, num_buckets):
+        """Move all keys to a table with the given number of buckets."""
+
+        self.num_buckets = num_buckets
+        self.rehash_table()
+
+    def _place(self, key, b0, b1, value=None):
+        """Store a key which is not present, evicting other keys if needed.
+
+        Returns None on success. If the eviction loop times out, returns
+        the key which was left without a bucket and its value.
+        """
+        values = self.values
+        # If one of the slots is empty, insert the element there.
+        for b in (b0, b1):
+          if self.table[b] is None:
+            self.table[b] = key
+            if values is not None:
+              values[b] = value
+            return None
+
         # Timeout variable represents limit for maximum number of insertions and swaps between two tables.  
         timeout = 5 * int(math.log(self.n) + 1)
-        b0, b1 = 0, 0
+        b = b0
         for _ in range(timeout):
-          # Calculate hash index with first hash function.
-          b0 = self.hashes[0].hash(key)
-
-          # If the hash index is the same as the previously calculated hash index of the second hash function,
-          # calculate again the hash index with the second function.
-          if b0 == b1:
-            b0 = self.hashes[1].hash(key)
-
           # If the slot is empty, insert the element and stop insertion method.  
-          if self.table[b0] is None:
-            self.table[b0] = key
-            return
-          
+          if self.table[b] is None:
+            self.table[b] = key
+            if values is not None:
+              values[b] = value
+            return None
+
           # Swap elements
-          temp = self.table[b0]
-          self.table[b0] = key
+          temp = self.table[b]
+          self.table[b] = key
           key = temp
+          if values is not None:
+            value, values[b] = values[b], value
 
-          b1 = b0
-          
-        # If the insertion of the element has failed, rehash the table and try insert it again.
-        self.rehash_table()
-        self.insert(key)
+          # The evicted element moves to its other bucket. If the first hash function
+          # gives the bucket it was evicted from, use the second one.
+          prev, b = b, self.hashes[0].hash(key)
+          if b == prev:
+            b = self.hashes[1].hash(key)
 
-    def rehash_table(self):
-        # Reset counter.
+        return key, value
+
+    def rehash_table(self, pending=None):
+        """Rebuild the table with new hash functions.
+
+        All keys, including the stash and the pending one which did not fit,
+        are staged and placed again in a table of num_buckets buckets. If
+        some key does not fit even to the stash, we pick other hash functions
+        and start over. Each try is counted in rebuild_attempts. After
+        max_rebuild_attempts failed tries, the number of buckets is doubled,
+        so a table filled beyond what cuckoo hashing can hold still gets
+        rebuilt in bounded time.
+        """
+        # Stage all keys of the old table with their values.
+        values = self.values or [None] * len(self.table)
+        items = [(x, v) for x, v in zip(self.table, values) if x is not None]
+        items += zip(self.stash, self.stash_values)
+        if pending is not None:
+          items.append(pending)
+        assert len(items) <= self.num_buckets + self.stash_size, "Cannot rebuild an overfull table."
+
+        failed = 0
+        while True:
+          if failed == self.max_rebuild_attempts:
+            self.num_buckets *= 2
+            failed = 0
+          self.rebuild_attempts += 1
+          failed += 1
+          # Create new hash functions and an empty table.
+          self.hashes = [self.hash_factory(self.num_buckets), self.hash_factory(self.num_buckets)]
+          self.table = [None] * self.num_buckets
+          if self._with_values:
+            self.values = [None] * self.num_buckets
+          self.stash, self.stash_values = [], []
+          for x, v in items:
+            homeless = self._place(x, self.hashes[0].hash(x), self.hashes[1].hash(x), v)
+            if homeless is not None:
+              if len(self.stash) == self.stash_size:
+                break
+              self.stash.append(homeless[0])
+              self.stash_values.append(homeless[1])
+          else:
+            break
+
+    def remove(self, key):
+        """Remove the key from the table. Returns whether it was present."""
+
+        return self._remove(key)[0]
+
+    def _remove(self, key):
+        """Remove the key, returning whether it was present and its value."""
+
+        for b in (self.hashes[0].hash(key), self.hashes[1].hash(key)):
+          if self.table[b] == key:
+            self.table[b] = None
+            self.n -= 1
+            if self.values is None:
+              return True, None
+            value, self.values[b] = self.values[b], None
+            return True, value
+        if key in self.stash:
+          i = self.stash.index(key)
+          self.stash.pop(i)
+          self.n -= 1
+          return True, self.stash_values.pop(i)
+        return False, None
+
+class CuckooMap(CuckooTable):
+    """Hash table with Cuckoo hashing, which maps keys to values.
+
+    Values are kept in a list parallel to the buckets, so checking the two
+    buckets of a key finds its value too. Options are the same as for
+    CuckooTable.
+    """
+
+    _with_values = True
+
+    def get(self, key, default=None):
+        """Return the value of the key, or default if it is not present."""
+
+        for b in (self.hashes[0].hash(key), self.hashes[1].hash(key)):
+          if self.table[b] == key:
+            return self.values[b]
+        if key in self.stash:
+          return self.stash_values[self.stash.index(key)]
+        return default
+
+    def put(self, key, value):
+        """Set the value of the key, adding the key if it is not present."""
+
+        b0 = self.hashes[0].hash(key)
+        b1 = self.hashes[1].hash(key)
+        for b in (b0, b1):
+          if self.table[b] == key:
+            self.values[b] = value
+            return
+        if key in self.stash:
+          self.stash_values[self.stash.index(key)] = value
+          return
+        self._insert_hashed(key, b0, b1, value)
+
+    def pop(self, key, default=None):
+        """Remove the key and return its value, or default if it is not present."""
+
+        found, value = self._remove(key)
+        return value if found else default
+
+class BucketCuckooTable:
+    """Hash table with bucketized Cuckoo hashing.
+
+    Each of num_buckets buckets has `slots` slots for keys and each key
+    may be stored in any slot of the buckets given by `num_hashes` hash
+    functions. All slots are stored in a single flat list, bucket after
+    bucket, so the slots of one bucket are adjacent. Unused slots contain
+    None. With 4 slots and 2 hash functions, the table works well
+    up to about 90% of its slots used.
+    """
+
+    # Failed rebuilds with new hash functions before the table doubles instead.
+    # Random walks fail more often near the load limit of bigger buckets,
+    # so more attempts are allowed than in CuckooTable.
+    max_rebuild_attempts = 20
+
+    def __init__(self, num_buckets, slots=4, num_hashes=2, max_load=None, hash_factory=TabulationHash):
+        """Initialize the table with the given number of buckets.
+
+        Without max_load, the number of buckets stays constant, unless
+        the keys cannot be placed at all (see rehash_table). Otherwise,
+        the table doubles whenever more than max_load of its slots are used.
+        Hash functions are created by calling hash_factory(num_buckets)."""
+
+        assert num_hashes >= 2, "BucketCuckooTable: at least two hash functions are needed"
+        assert max_load is None or 0 < max_load < 1, "BucketCuckooTable: max_load must be in (0, 1)"
+        self.slots = slots
+        self.num_hashes = num_hashes
+        self.max_load = max_load
         self.n = 0
-        # Create new hash functions.
-        self.hashes = [TabulationHash(self.num_buckets), TabulationHash(self.num_buckets)]
-        # Store old table.
-        temp_table = self.table
-
-        # Init new table.
-        self.table = [None] * self.num_buckets
-        for x in temp_table:
-          if x is not None:
-            self.insert(x)
\ No newline at end of file
+
+        # The array of slots
+        self.num_buckets = num_buckets
+        self.table = [None] * (num_buckets * slots)
+        self.hash_factory = hash_factory
+        self.hashes = [hash_factory(num_buckets) for _ in range(num_hashes)]
+
+        # Number of attempts to rebuild the table with new hash functions
+        self.rebuild_attempts = 0
+
+    def _buckets(self, key):
+        """Return the first slot of each bucket where key may be stored."""
+
+        return [h.hash(key) * self.slots for h in self.hashes]
+
+    def lookup(self, key):
+        """Check if the table contains the given key. Returns True or False."""
+
+        table = self.table
+        for start in self._buckets(key):
+            for i in range(start, start + self.slots):
+                if table[i] == key:
+                    return True
+        return False
+
+    def insert(self, key):
+        """Insert a new key to the table. If it is already present, nothing happens."""
+
+        if self.lookup(key):
+          return
+        self.n += 1
+
+        # If the insertion of the element has failed, rehash the table with it.
+        homeless = self._place(key)
+        if homeless is not None:
+          self.rehash_table(homeless)
+
+        # Grow the table if it is getting too full.
+        if self.max_load is not None and self.n > self.max_load * len(self.table):
+          self.resize(2 * self.num_buckets)
+
+    def _place(self, key):
+        """Store a key which is not present, evicting other keys if needed.
+
+        Returns None on success. If the random walk of evictions times out,
+        returns the key which was left without a slot.
+        """
+        table = self.table
+        # Random walks at high load are longer than in CuckooTable
+        timeout = 50 * int(math.log(self.n) + 1)
+        prev = None
+        for _ in range(timeout):
+          # Use a free slot in any of the buckets of the key, if there is one.
+          buckets = self._buckets(key)
+          for start in buckets:
+            for i in range(start, start + self.slots):
+              if table[i] is None:
+                table[i] = key
+                return None
+
+          # Otherwise evict a random key from a bucket other than the one
+          # the current key was just evicted from.
+          start = random.choice([b for b in buckets if b != prev] or buckets)
+          i = start + random.randrange(self.slots)
+          key, table[i] = table[i], key
+          prev = start
+
+        return key
+
+    def resize(self, num_buckets):
+        """Move all keys to a table with the given number of buckets."""
+
+        self.num_buckets = num_buckets
+        self.rehash_table()
+
+    def rehash_table(self, pending=None):
+        """Rebuild the table with new hash functions, like CuckooTable.rehash_table.
+
+        After max_rebuild_attempts failed tries, the number of buckets is doubled.
+        """
+
+        keys = [x for x in self.table if x is not None]
+        if pending is not None:
+          keys.append(pending)
+        assert len(keys) <= self.num_buckets * self.slots, "Cannot rebuild an overfull table."
+
+        failed = 0
+        while True:
+          if failed == self.max_rebuild_attempts:
+            self.num_buckets *= 2
+            failed = 0
+          self.rebuild_attempts += 1
+          failed += 1
+          self.hashes = [self.hash_factory(self.num_buckets) for _ in range(self.num_hashes)]
+          self.table = [None] * (self.num_buckets * self.slots)
+          if all(self._place(x) is None for x in keys):
+            break
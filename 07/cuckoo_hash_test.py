@@ -2,11 +2,12 @@
 import sys
 import random
 
-from cuckoo_hash import CuckooTable
+from cuckoo_hash import CuckooTable, CuckooMap, BucketCuckooTable, \
+    TabulationHash, TabulationHash64, CompactTabulationHash
 
-def simple_test(n, table_size_percentage):
+def simple_test(n, table_size_percentage, hash_factory=TabulationHash):
     random.seed(42)
-    table = CuckooTable(n*table_size_percentage//100)
+    table = CuckooTable(n*table_size_percentage//100, hash_factory=hash_factory)
 
     # Insert an arithmetic progression
     for i in range(n):
@@ -22,12 +23,172 @@ def multiple_test(min_n, max_n, step_n, table_size_percentage):
         print("\tn={}".format(n))
         simple_test(n, table_size_percentage)
 
+def bulk_test(n, table_size_percentage):
+    random.seed(42)
+    table = CuckooTable(n*table_size_percentage//100)
+
+    # Insert an arithmetic progression in a few batches, with some keys repeated
+    keys = [37*i for i in range(n)]
+    for start in range(0, n, 1000):
+        table.insert_many(keys[start : start+1500])
+
+    # Verify contents of the table
+    assert all(table.lookup_many(keys)), "Item not present in table, but it should be."
+    assert not any(table.lookup_many([key+1 for key in keys])), "Item present in table, even though it should not be."
+    for key in keys[::97]:
+        assert table.lookup(key), "Item not present in table, but it should be."
+
+def rebuild_test(n, table_size_percentage):
+    random.seed(42)
+    table = CuckooTable(n*table_size_percentage//100)
+
+    # Fill the table so tightly that it has to be rebuilt
+    for i in range(n):
+        table.insert(37*i)
+
+    assert table.rebuild_attempts > 0, "Table was expected to be rebuilt."
+    assert table.n == n, "Table counts {} items instead of {}.".format(table.n, n)
+    for i in range(n):
+        assert table.lookup(37*i), "Item not present in table, but it should be."
+        assert not table.lookup(37*i+1), "Item present in table, even though it should not be."
+
+def stash_test(n, table_size_percentage, stash_size, seeds):
+    plain_rebuilds, stash_rebuilds = 0, 0
+    for seed in range(seeds):
+        random.seed(seed)
+        plain = CuckooTable(n*table_size_percentage//100)
+        for i in range(n):
+            plain.insert(37*i)
+        plain_rebuilds += plain.rebuild_attempts
+
+        random.seed(seed)
+        table = CuckooTable(n*table_size_percentage//100, stash_size=stash_size)
+        for i in range(n):
+            table.insert(37*i)
+        table.insert_many([37*i for i in range(n)])
+        stash_rebuilds += table.rebuild_attempts
+
+        assert table.n == n, "Table counts {} items instead of {}.".format(table.n, n)
+        assert len(table.stash) <= stash_size, "Stash is too big."
+        assert all(table.lookup_many([37*i for i in range(n)])), "Item not present in table, but it should be."
+        for i in range(n):
+            assert table.lookup(37*i), "Item not present in table, but it should be."
+            assert not table.lookup(37*i+1), "Item present in table, even though it should not be."
+
+    assert stash_rebuilds < plain_rebuilds, "Stash did not save any rebuilds."
+
+def grow_test(n, max_load):
+    random.seed(42)
+    table = CuckooTable(4, max_load=max_load)
+
+    for i in range(n):
+        table.insert(37*i)
+    table.insert_many([41*i for i in range(n)])
+
+    assert table.n <= max_load * table.num_buckets, "Table did not grow."
+    for i in range(n):
+        assert table.lookup(37*i) and table.lookup(41*i), "Item not present in table, but it should be."
+        assert not table.lookup(37*i + 2**31), "Item present in table, even though it should not be."
+
+def high_load_test(n, make_table):
+    random.seed(42)
+    table = make_table()
+
+    # Tables filled beyond what cuckoo hashing can hold must still grow
+    # after a bounded number of failed rebuilds
+    for i in range(n):
+        table.insert(37*i)
+
+    assert table.n == n, "Table counts {} items instead of {}.".format(table.n, n)
+    for i in range(n):
+        assert table.lookup(37*i), "Item not present in table, but it should be."
+        assert not table.lookup(37*i + 2**31), "Item present in table, even though it should not be."
+
+def bucket_test(n, table_size_percentage, slots, num_hashes, max_load=None):
+    random.seed(42)
+    table = BucketCuckooTable(n*table_size_percentage//100//slots, slots, num_hashes, max_load)
+
+    for i in range(n):
+        table.insert(37*i)
+
+    assert table.n == n, "Table counts {} items instead of {}.".format(table.n, n)
+    for i in range(n):
+        assert table.lookup(37*i), "Item not present in table, but it should be."
+        assert not table.lookup(37*i+1), "Item present in table, even though it should not be."
+
+def map_test(n, table_size_percentage, **options):
+    random.seed(42)
+    table = CuckooMap(n*table_size_percentage//100, **options)
+    gold = {}
+
+    for i in range(4*n):
+        key = 37 * random.randrange(2*n)
+        op = random.randrange(4)
+        if op == 0:
+            assert table.pop(key, -1) == gold.pop(key, -1), "Map popped a wrong value."
+        elif op == 1:
+            assert table.get(key, -1) == gold.get(key, -1), "Map returned a wrong value."
+        else:
+            table.put(key, i)
+            gold[key] = i
+
+    assert table.n == len(gold), "Map counts {} items instead of {}.".format(table.n, len(gold))
+    for key in range(0, 37*2*n, 37):
+        assert table.get(key, -1) == gold.get(key, -1), "Map returned a wrong value."
+        assert table.lookup(key) == (key in gold), "Lookup in map returned a wrong result."
+
+def wide_keys_test(n, table_size_percentage):
+    random.seed(42)
+    table = CuckooTable(2*n*table_size_percentage//100, hash_factory=TabulationHash64)
+
+    # Keys differing only in the upper 32 bits, and strings
+    keys = [(i << 32) | 12345 for i in range(n)] + ["key-{}".format(i) for i in range(n)]
+    table.insert_many(keys[::2])
+    for key in keys[1::2]:
+        table.insert(key)
+
+    assert table.n == 2*n, "Table counts {} items instead of {}.".format(table.n, 2*n)
+    assert all(table.lookup_many(keys)), "Item not present in table, but it should be."
+    for i in range(n):
+        assert table.lookup((i << 32) | 12345), "Item not present in table, but it should be."
+        assert not table.lookup((i << 32) | 12346), "Item present in table, even though it should not be."
+        assert not table.lookup("key-{}".format(i + n)), "Item present in table, even though it should not be."
+
+def hash_many_test(n, num_buckets, hash_class=TabulationHash, bits=32):
+    random.seed(42)
+    h = hash_class(num_buckets)
+    keys = [random.randint(0, 2**bits - 1) for _ in range(n)]
+    buckets = h.hash_many(keys)
+    for key, bucket in zip(keys, buckets):
+        assert h.hash(key) == bucket, "Bulk hash differs from hashing a single key."
+
 # A list of all tests
 tests = [
     ("small",       lambda: simple_test(100, 400)),
     ("middle",      lambda: simple_test(31415, 300)),
     ("big",         lambda: simple_test(1000000, 300)),
     ("tight",       lambda: multiple_test(20000, 40000, 500, 205)),
+    ("hash_many",   lambda: hash_many_test(100000, 31415)),
+    ("hash_many64", lambda: hash_many_test(100000, 31415, TabulationHash64, 64)),
+    ("hash_many8",  lambda: hash_many_test(100000, 31415, lambda n: CompactTabulationHash(n, 8))),
+    ("hash_many16", lambda: hash_many_test(100000, 31415, lambda n: CompactTabulationHash(n, 16))),
+    ("compact_tab", lambda: simple_test(31415, 300, lambda n: CompactTabulationHash(n, 16))),
+    ("wide_keys",   lambda: wide_keys_test(20000, 300)),
+    ("map",         lambda: map_test(20000, 300)),
+    ("map_tight",   lambda: map_test(20000, 210, stash_size=2)),
+    ("map_grow",    lambda: map_test(20000, 1, max_load=0.45)),
+    ("bulk",        lambda: bulk_test(31415, 300)),
+    ("bulk_tight",  lambda: bulk_test(30000, 205)),
+    ("rebuild",     lambda: rebuild_test(20000, 205)),
+    ("grow",        lambda: grow_test(100000, 0.45)),
+    ("stash",       lambda: stash_test(40000, 205, 4, 5)),
+    ("bucket",      lambda: bucket_test(31415, 111, 4, 2)),
+    ("bucket_3way", lambda: bucket_test(31415, 105, 4, 3)),
+    ("bucket_grow", lambda: bucket_test(31415, 1, 4, 2, 0.9)),
+    ("high_load",   lambda: high_load_test(5000, lambda: CuckooTable(64, max_load=0.7))),
+    ("overfull",    lambda: high_load_test(5000, lambda: CuckooTable(5100))),
+    ("bucket_high_load", lambda: high_load_test(5000, lambda: BucketCuckooTable(16, max_load=0.99))),
+    ("bucket_overfull",  lambda: high_load_test(5000, lambda: BucketCuckooTable(1260))),
 ]
 
 if __name__ == "__main__":
@@ -0,0 +1,122 @@
+import numpy
+
+# The LRU cache is simulated the same way as in CachedMatrix of the matrix
+# experiments: description of memory blocks is stored in an array
+# blocks[block_index][B_xxx]. If the block is cached, B_CACHED is 1 and
+# B_LRU_NEXT and B_LRU_PREV point to neighboring blocks in the cyclic LRU list.
+# Otherwise, B_CACHED is 0 and the block is not in the LRU.
+B_CACHED = 0
+B_LRU_NEXT = 1
+B_LRU_PREV = 2
+
+class SimulatedCache:
+    """A simulated memory of mem_items items with an LRU cache of M items in blocks of B items.
+
+    Arrays are placed in the memory by allocate, one after another, and
+    every access to an item is reported by access.
+    """
+
+    def __init__(self, mem_items, M, B):
+        assert B>0, "Blocks must be non-empty."
+        assert M%B == 0, "Cache size must be divisible by block size."
+        assert M >= 2*B, "Cache must have at least 2 blocks."
+
+        self.B = B
+        self.M = M
+        self.mem_items = mem_items
+        self.mem_blocks = (mem_items+B-1) // B
+        self.cache_blocks = M//B
+        self.cache_used = 0
+        self.allocated = 0
+
+        # Initialize the LRU list. There is a virtual block right after the last real block,
+        # which serves as a head of the cyclic LRU list.
+        self.blocks = numpy.zeros(shape=(self.mem_blocks+1, 3), dtype=numpy.int32, order="C")
+        self.lru_head = self.mem_blocks
+        self.blocks[self.lru_head, B_LRU_NEXT] = self.lru_head
+        self.blocks[self.lru_head, B_LRU_PREV] = self.lru_head
+
+        self.reset_stats()
+
+    def allocate(self, n):
+        """Reserve n items of memory, returning the address of the first one.
+
+        Arrays start at block boundaries, so they share no blocks.
+        """
+        addr = self.allocated
+        self.allocated += (n+self.B-1) // self.B * self.B
+        assert self.allocated <= self.mem_items, "Simulated memory exhausted."
+        return addr
+
+    def reset_stats(self):
+        """Reset statistic counters."""
+
+        self.stat_cache_misses = 0
+        self.stat_accesses = 0
+
+    def access(self, addr):
+        """Bring the given address to the cache."""
+
+        blocks = self.blocks
+        i = addr // self.B      # Which block to bring
+        if blocks[i, B_CACHED] > 0:
+            self._lru_remove(i)
+        else:
+            if self.cache_used < self.cache_blocks:
+                # We still have room in the cache.
+                self.cache_used += 1
+            else:
+                # We need to evict the least-recently used block to make space.
+                replace = blocks[self.lru_head, B_LRU_PREV]
+                self._lru_remove(replace)
+                assert blocks[replace, B_CACHED] > 0, "Internal error: Buggy LRU list"
+                blocks[replace, B_CACHED] = 0
+            blocks[i, B_CACHED] = 1
+            self.stat_cache_misses += 1
+        self._lru_add_after(i, self.lru_head)
+        self.stat_accesses += 1
+
+    def _lru_remove(self, i):
+        """Remove block from the LRU list."""
+
+        blocks = self.blocks
+        prev, next = blocks[i, B_LRU_PREV], blocks[i, B_LRU_NEXT]
+        blocks[prev, B_LRU_NEXT] = next
+        blocks[next, B_LRU_PREV] = prev
+
+    def _lru_add_after(self, i, after):
+        """Add block at the given position in the LRU list."""
+
+        blocks = self.blocks
+        next = blocks[after, B_LRU_NEXT]
+        blocks[after, B_LRU_NEXT] = i
+        blocks[next, B_LRU_PREV] = i
+        blocks[i, B_LRU_NEXT] = next
+        blocks[i, B_LRU_PREV] = after
+
+class CachedArray:
+    """A list or array placed in simulated memory.
+
+    It can be used instead of the list or array it wraps; every read
+    or write of an item goes through the simulated cache.
+    """
+
+    def __init__(self, items, cache):
+        self.items = items
+        self.cache = cache
+        self.base = cache.allocate(len(items))
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, i):
+        self.cache.access(self.base + i)
+        return self.items[i]
+
+    def __setitem__(self, i, value):
+        self.cache.access(self.base + i)
+        self.items[i] = value
+
+    def __iter__(self):
+        for i in range(len(self.items)):
+            yield self[i]
@@ -1,36 +1,18 @@
-import random
 import math
 
-class TabulationHash:
-    """Hash function for hashing by tabulation.
-
-    The 32-bit key is split to four 8-bit parts. Each part indexes
-    a separate table of 256 randomly generated values. Obtained values
-    are XORed together.
-    """
-
-    def __init__(self, num_buckets):
-        self.tables = [None] * 4
-        for i in range(4):
-            self.tables[i] = [random.randint(0, 0xffffffff) for _ in range(256)]
-        self.num_buckets = num_buckets
-
-    def hash(self, key):
-        h0 = key & 0xff
-        h1 = (key >> 8) & 0xff
-        h2 = (key >> 16) & 0xff
-        h3 = (key >> 24) & 0xff
-        t = self.tables
-        return (t[0][h0] ^ t[1][h1] ^ t[2][h2] ^ t[3][h3]) % self.num_buckets
+from hash_functions import TabulationHash
 
 class CuckooTable:
     """Hash table with Cuckoo hashing.
 
     We have two hash functions, which map 32-bit keys to buckets of a common
     hash table. Unused buckets contain None.
+
+    Hash functions are drawn from hash_factory, which may be any family
+    from hash_functions.
     """
 
-    def __init__(self, num_buckets):
+    def __init__(self, num_buckets, hash_factory=TabulationHash):
         """Initialize the table with the given number of buckets.
         The number of buckets is expected to stay constant."""
 
@@ -38,10 +20,14 @@ class CuckooTable:
 
         # The array of buckets
         self.num_buckets = num_buckets
-        self.table = [None] * num_buckets
+        self.table = self._empty_table()
 
         # Create two fresh hash functions
-        self.hashes = [TabulationHash(num_buckets), TabulationHash(num_buckets)]
+        self.hash_factory = hash_factory
+        self.hashes = [hash_factory(num_buckets), hash_factory(num_buckets)]
+
+    def _empty_table(self):
+        return [None] * self.num_buckets
 
     def lookup(self, key):
         """Check if the table contains the given key. Returns True or False."""
@@ -92,12 +78,12 @@ class CuckooTable:
         # Reset counter.
         self.n = 0
         # Create new hash functions.
-        self.hashes = [TabulationHash(self.num_buckets), TabulationHash(self.num_buckets)]
+        self.hashes = [self.hash_factory(self.num_buckets), self.hash_factory(self.num_buckets)]
         # Store old table.
         temp_table = self.table
 
         # Init new table.
-        self.table = [None] * self.num_buckets
+        self.table = self._empty_table()
         for x in temp_table:
           if x is not None:
             self.insert(x)
\ No newline at end of file
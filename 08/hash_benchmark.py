@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+"""Wall-clock benchmark of hash tables.
+
+For every table, hash family, size and load, it measures throughput of
+inserts, successful lookups and unsuccessful lookups, and percentiles of
+latencies of single operations. Results are printed as JSON, so that
+runs can be compared for regressions.
+
+The "cuckoo" table is CuckooTable of cuckoo_hash.py in this directory,
+with a fixed number of buckets and recursive rebuilds, not the growing
+table of 07. The report names it in its "cuckoo_table" field.
+"""
+
+import argparse, json, platform, sys, time
+
+import numpy
+
+from hash_functions import rng_init, rng_fill_u32, families
+from hash_experiment import HashTable, permute_list, CUCKOO_TABLE
+from cuckoo_hash import CuckooTable
+
+# Cuckoo tables with two hash functions cannot be filled more than this
+CUCKOO_MAX_LOAD = 0.5
+
+# Reported percentiles of latencies, by their names in the output
+PERCENTILES = [("p50", 50), ("p90", 90), ("p99", 99), ("p99_9", 99.9)]
+
+def load_factor(text):
+    """Parse a load factor for argparse, which must lie strictly between 0 and 1."""
+    load = float(text)
+    if not 0 < load < 1:
+        raise argparse.ArgumentTypeError("load must be between 0 and 1, got {}".format(text))
+    return load
+
+def make_table(kind, hash_fun_factory, num_buckets):
+    if kind == "cuckoo":
+        return CuckooTable(num_buckets, hash_factory=hash_fun_factory)
+    return HashTable(hash_fun_factory, num_buckets)
+
+def throughput(op, keys):
+    """Return operations per second of op applied to all keys."""
+    start = time.perf_counter()
+    for key in keys:
+        op(key)
+    return len(keys) / (time.perf_counter() - start)
+
+def latencies(op, keys):
+    """Return a numpy array of nanoseconds taken by op on each key."""
+    clock = time.perf_counter_ns
+    result = numpy.empty(len(keys), dtype=numpy.int64)
+    for i, key in enumerate(keys):
+        start = clock()
+        op(key)
+        result[i] = clock() - start
+    return result
+
+def measure(kind, hash_fun_factory, num_buckets, load, seed, samples):
+    """Benchmark one configuration, returning a dict of results per operation."""
+    n = int(num_buckets * load)
+    rng_init(seed)
+    keys = (rng_fill_u32(n + samples) >> 1).tolist()
+    present, absent = keys[:n], keys[n:]
+    # Missing keys have the top bit set, so they are not in the table
+    absent = [key | 0x80000000 for key in absent]
+
+    # Build the table twice with the same hash functions: once for throughput,
+    # once timing every insert, since timing every insert slows it down.
+    rng_init(seed + 1)
+    H = make_table(kind, hash_fun_factory, num_buckets)
+    insert_rate = throughput(H.insert, present)
+    rng_init(seed + 1)
+    timed = make_table(kind, hash_fun_factory, num_buckets)
+    insert_times = latencies(timed.insert, present)
+
+    hits = present[:]
+    permute_list(hits)
+    hits = hits[:samples]
+    results = {"insert": (insert_rate, insert_times)}
+    for name, lookup_keys in [("lookup_hit", hits), ("lookup_miss", absent)]:
+        results[name] = (throughput(H.lookup, lookup_keys), latencies(H.lookup, lookup_keys))
+
+    return {
+        name: {
+            "ops_per_sec": round(rate, 1),
+            "latency_ns": {label: int(numpy.percentile(times, p)) for label, p in PERCENTILES},
+        }
+        for name, (rate, times) in results.items()
+    }
+
+def run_benchmark(tables, family_names, sizes, loads, seed, samples):
+    results = []
+    for kind in tables:
+        for family in family_names:
+            for num_buckets in sizes:
+                for load in loads:
+                    if kind == "cuckoo" and load >= CUCKOO_MAX_LOAD:
+                        continue
+                    print("    ", kind, family, num_buckets, load, file=sys.stderr)
+                    results.append({
+                        "table": kind,
+                        "hash": family,
+                        "num_buckets": num_buckets,
+                        "load": load,
+                        "ops": measure(kind, families[family], num_buckets, load, seed, samples),
+                    })
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "seed": seed,
+        "cuckoo_table": CUCKOO_TABLE,
+        "results": results,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tables", nargs="+", choices=["linear", "cuckoo"], default=["linear", "cuckoo"])
+    parser.add_argument("--hashes", nargs="+", choices=sorted(families), default=sorted(families))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[2**12, 2**16, 2**20],
+                        help="numbers of buckets, powers of two")
+    parser.add_argument("--loads", nargs="+", type=load_factor, default=[0.25, 0.45, 0.7, 0.9])
+    parser.add_argument("--samples", type=int, default=10000, help="number of lookups of each kind")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write JSON to this file instead of standard output")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        assert size > 0 and size & (size - 1) == 0, "Sizes must be powers of two."
+
+    report = run_benchmark(args.tables, args.hashes, args.sizes, args.loads, args.seed, args.samples)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
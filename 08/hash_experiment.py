@@ -1,216 +1,722 @@
 #!/usr/bin/env python3
 
-import random, sys
+import argparse, functools, hashlib, multiprocessing
+from array import array
 from math import sqrt
 
-# Our wrapper of random so we can substitute it with another random generator
-rng_init = lambda x: random.seed(x)
-rng_next_u32 = lambda: random.randint(0, 2**32 - 1)
+import numpy
 
-class TabulationHash:
-    """Hash function for hashing by tabulation.
+from hash_functions import rng_init, rng_next_u32, rng_fill_u32, rng_backends, families
+from cached_memory import SimulatedCache, CachedArray
+from cuckoo_hash import CuckooTable
 
-    The 32-bit key is split to four 8-bit parts. Each part indexes
-    a separate table of 256 randomly generated values. Obtained values
-    are XORed together.
-    """
+# Mark empty and deleted buckets in compact tables, so these keys cannot be stored there
+EMPTY_U32 = 0xffffffff
+DELETED_U32 = 0xfffffffe
+
+# Marks a deleted bucket in list-based tables
+DELETED = object()
+
+# Probe lengths counted by histograms; longer probes fall into the last entry
+HISTOGRAM_SIZE = 4096
 
-    def __init__(self, num_buckets):
-        self.num_buckets = num_buckets
-        self.tables = [None] * 4
-        for i in range(4):
-            self.tables[i] = [ rng_next_u32() for _ in range(256) ]
-
-    def __call__(self, key):
-        h0 = key & 0xff;
-        h1 = (key >> 8) & 0xff;
-        h2 = (key >> 16) & 0xff;
-        h3 = (key >> 24) & 0xff;
-        t = self.tables
-        return (t[0][h0] ^ t[1][h1] ^ t[2][h2] ^ t[3][h3]) % self.num_buckets
-
-class PolynomialHash:
-    """Hash function using polynomial modulo a prime."""
-
-    def __init__(self, num_buckets, degree, prime = 2147483647):
-        self.num_buckets = num_buckets
-        self.prime = prime
-        self.coefs = [ rng_next_u32() for _ in range(degree + 1) ]
-
-    def __call__(self, key):
-        acc = 0
-        for c in self.coefs:
-            acc = (acc * key + c) % self.prime
-        return acc % self.num_buckets
-
-LinearHash = lambda num_buckets: PolynomialHash(num_buckets, 1)
-QuadraticHash = lambda num_buckets: PolynomialHash(num_buckets, 2)
-
-class MultiplyShiftLowHash:
-    """Multiply-shift hash function taking top bits of 32-bit word"""
-
-    def __init__(self, num_buckets):
-        self.mask = num_buckets - 1
-        assert (num_buckets & self.mask == 0), \
-            "MultiplyShiftLowHash: num_buckets must be power of 2"
-
-        self.mult = rng_next_u32() | 0x1
-        self.shift = 0;
-        tmp = num_buckets - 1
-        while 0x80000000 & tmp == 0:
-            tmp <<= 1
-            self.shift += 1
-
-    def __call__(self, key):
-        return ((key * self.mult) >> self.shift) & self.mask
-
-class MultiplyShiftHighHash:
-    """Multiply-shift hash function taking low bits of upper half of 64-bit word"""
-
-    def __init__(self, num_buckets):
-        self.mask = num_buckets - 1
-        assert (num_buckets & self.mask == 0), \
-            "MultiplyShiftLowHash: num_buckets must be power of 2"
-        self.mult = (rng_next_u32() << 32) | rng_next_u32() | 0x1
-
-    def __call__(self, key):
-        return ((key * self.mult) >> 32) & self.mask
+def histogram_percentile(histogram, fraction):
+    """Return the least probe length not exceeded by the given fraction of operations."""
+    total = sum(histogram)
+    if total == 0:
+        return 0
+    count = 0
+    for steps, ops in enumerate(histogram):
+        count += ops
+        if count >= fraction * total:
+            return steps
 
 class HashTable:
-    """Hash table with linear probing"""
+    """Hash table with linear probing
+
+    With compact=True, keys are stored in a typed array of 32-bit integers
+    (4 bytes per bucket) and empty buckets hold EMPTY_U32 instead of None.
+    This saves memory only: reading a bucket still creates a Python int.
+
+    With max_load set, the table doubles when more than max_load of its
+    buckets are used. Keys are then moved from the old table to the new one
+    a few buckets per operation, so no single insert rehashes everything.
+    Until the move is finished, keys are looked up in both tables.
+    Steps spent by moving keys are counted separately from probe steps.
+
+    Keys are removed by backward shift: later keys of the run are moved
+    back to fill the hole, so the table looks as if the key was never
+    inserted. With deletion="tombstone", the bucket is marked as deleted
+    instead and reused by later inserts; tombstones lengthen probes until
+    the table is rebuilt. The old table of a migration always uses tombstones,
+    since shifting keys there could move them past the migration.
+
+    With probing="robin_hood", an inserted key takes the bucket of any key
+    which is closer to its home bucket, pushing that key further. Keys of
+    a run are thus ordered by their home buckets, which keeps probe lengths
+    even and lets lookups of missing keys stop at the first key closer to
+    its home than the missing key would be. It needs backward shift deletion.
+
+    With histogram=True, the table also counts how many operations took
+    each number of steps, so that percentiles of probe lengths can be
+    reported along with the average and maximum.
+    """
 
-    def __init__(self, hash_fun_factory, num_buckets):
-        self._hash = hash_fun_factory(num_buckets)
-        self._num_buckets = num_buckets
-        self._table = [None] * num_buckets
-        self._size = 0
+    # Whether every key has a value stored in an array parallel to the keys
+    _with_values = False
+
+    def __init__(self, hash_fun_factory, num_buckets, compact=False, max_load=None, deletion="shift",
+                 probing="linear", histogram=False):
+        assert deletion in ("shift", "tombstone"), "HashTable: unknown deletion {}".format(deletion)
+        assert probing in ("linear", "robin_hood"), "HashTable: unknown probing {}".format(probing)
+        assert probing == "linear" or deletion == "shift", "HashTable: Robin Hood probing needs shift deletion"
+        self._robin_hood = probing == "robin_hood"
+        self._hash_fun_factory = hash_fun_factory
+        self._empty = EMPTY_U32 if compact else None
+        self._deleted = DELETED_U32 if compact else DELETED
+        self._compact = compact
+        self._deletion = deletion
+        self._max_load = max_load
+        self._with_histogram = histogram
+        if max_load is not None:
+            assert 0 < max_load < 1, "HashTable: max_load must be in (0, 1)"
+            assert num_buckets >= 2, "HashTable: growing table needs at least 2 buckets"
+            # Enough buckets per operation to finish migrating before
+            # the new table itself reaches max_load
+            self._migrate_step = int(1 / max_load) + 1
+        self._setup(num_buckets)
+
+        # The table being migrated to the current one, if any
+        self._old_table = None
         self.reset_counter()
 
-    def _next_bucket(self, b):
-        return (b + 1) % self._num_buckets
-
-    def lookup(self, key):
-        """Check whether key is present in the table."""
-        ret = False
+    def _setup(self, num_buckets):
+        self._hash = self._hash_fun_factory(num_buckets)
+        self._num_buckets = num_buckets
+        self._table = self._empty_table(num_buckets)
+        self._values = self._empty_values(num_buckets) if self._with_values else None
+        self._size = 0
+        self._tombstones = 0
+        if self._max_load is not None:
+            # Keep at least one bucket empty, so that probing always stops
+            self._max_size = max(1, min(int(self._max_load * num_buckets), num_buckets - 1))
+
+    def _empty_table(self, num_buckets):
+        if self._compact:
+            return array('I', [EMPTY_U32]) * num_buckets
+        return [None] * num_buckets
+
+    def _empty_values(self, num_buckets):
+        if self._compact:
+            return array('Q', [0]) * num_buckets
+        return [None] * num_buckets
+
+    def _probe(self, key, table, hash, num_buckets):
+        """Find the bucket holding key, or the empty bucket ending its run.
+
+        With Robin Hood probing, the search also ends at the first key closer
+        to its home bucket than the searched key would be.
+
+        Returns the bucket, the first deleted or empty bucket seen (where
+        the key could be inserted), and the number of buckets inspected.
+        """
         steps = 1
-
-        b = self._hash(key)
-        while self._table[b] is not None:
-            if self._table[b] == key:
-              ret = True
-              break
+        b = hash(key)
+        free = None
+        dist = 0
+        while table[b] != self._empty and table[b] != key:
+            if table[b] == self._deleted:
+                if free is None:
+                    free = b
+            elif self._robin_hood and (b - hash(table[b])) % num_buckets < dist:
+                break
             steps += 1
-            b = self._next_bucket(b)
+            dist += 1
+            b = (b + 1) % num_buckets
+        return b, b if free is None else free, steps
+
+    def _find(self, key):
+        """Look for key in the current and the old table.
+
+        Returns whether it was found, the bucket in the current table
+        where it is or would be stored, the number of steps, and the bucket
+        in the old table if the key was found only there.
+        """
+        b, free, steps = self._probe(key, self._table, self._hash, self._num_buckets)
+        if self._table[b] == key:
+            return True, b, steps, None
+        if self._old_table is not None:
+            old_b, _, old_steps = self._probe(key, self._old_table, self._old_hash, self._old_num_buckets)
+            steps += old_steps
+            if self._old_table[old_b] == key:
+                return True, free, steps, old_b
+        return False, free, steps, None
 
+    def lookup(self, key):
+        """Check whether key is present in the table."""
+        self._migrate()
+        ret, _, steps, _ = self._find(key)
         self._update_counter(steps)
         return ret
 
     def insert(self, key):
         """Add the key in the table."""
-        assert self._size < self._num_buckets, "Cannot insert into a full table."
-        steps = 1
+        self._check_key(key)
+        self._migrate()
 
-        b = self._hash(key)
-        while self._table[b] is not None:
-            if self._table[b] == key: break
-            steps += 1
-            b = self._next_bucket(b)
-        else:
-            self._table[b] = key
+        found, b, steps, _ = self._find(key)
+        if not found:
+            steps += self._add(key, b)
 
         self._update_counter(steps)
 
+    def _check_key(self, key):
+        assert self._size < self._num_buckets, "Cannot insert into a full table."
+        assert key != self._empty and key != self._deleted, "Cannot insert the empty or deleted marker."
+
+    def _add(self, key, b, value=None):
+        """Store a new key in bucket b found by _find. Returns extra steps."""
+        steps = self._place(key, b, value)
+        self._size += 1
+        limit = self._max_size if self._max_load is not None else self._num_buckets - 1
+        if self._max_load is not None and self._size >= self._max_size:
+            self._grow()
+        elif self._tombstones > 0 and self._size + self._tombstones >= limit:
+            # Tombstones took the free buckets, but there are not enough
+            # keys to grow, so purge the tombstones at the current size
+            self._rebuild()
+        return steps
+
+    def remove(self, key):
+        """Remove the key from the table, if it is present."""
+        self._remove(key)
+
+    def _remove(self, key):
+        """Remove the key, returning whether it was present and its value."""
+        self._migrate()
+        found, value = False, None
+
+        b, _, steps = self._probe(key, self._table, self._hash, self._num_buckets)
+        if self._table[b] == key:
+            found = True
+            if self._values is not None:
+                value = self._values[b]
+            self._size -= 1
+            if self._deletion == "shift":
+                steps += self._shift_back(b)
+            else:
+                self._table[b] = self._deleted
+                self._tombstones += 1
+                if self._values is not None:
+                    self._values[b] = self._values_empty()
+
+        if self._old_table is not None:
+            # The old table may hold the key, either not migrated yet,
+            # or as a stale copy which must not be found again.
+            old_b, _, old_steps = self._probe(key, self._old_table, self._old_hash, self._old_num_buckets)
+            if self._old_table[old_b] == key:
+                if not found:
+                    found = True
+                    if self._old_values is not None:
+                        value = self._old_values[old_b]
+                self._old_table[old_b] = self._deleted
+            steps += old_steps
+
+        self._update_counter(steps)
+        return found, value
+
+    def _values_empty(self):
+        return 0 if self._compact else None
+
+    def _place(self, key, b, value=None):
+        """Store a new key in bucket b found by _probe. Returns extra steps.
+
+        With Robin Hood probing, the bucket may hold a key closer to its
+        home, which is pushed further, and so on until an empty bucket.
+        """
+        table, values, num_buckets = self._table, self._values, self._num_buckets
+        if table[b] == self._deleted:
+            self._tombstones -= 1
+
+        steps = 0
+        if self._robin_hood:
+            dist = (b - self._hash(key)) % num_buckets
+            while table[b] != self._empty:
+                other_dist = (b - self._hash(table[b])) % num_buckets
+                if other_dist < dist:
+                    key, table[b] = table[b], key
+                    if values is not None:
+                        value, values[b] = values[b], value
+                    dist = other_dist
+                steps += 1
+                dist += 1
+                b = (b + 1) % num_buckets
+        table[b] = key
+        if values is not None:
+            values[b] = value
+        return steps
+
+    def _shift_back(self, hole):
+        """Fill the hole in a run by moving later keys back. Returns steps.
+
+        This keeps Robin Hood runs ordered too: the first key which cannot
+        move is at its home bucket and no later key of the run can move.
+        """
+        table, values, num_buckets = self._table, self._values, self._num_buckets
+        steps = 0
+        b = hole
+        while True:
+            b = (b + 1) % num_buckets
+            steps += 1
+            key = table[b]
+            if key == self._empty:
+                break
+            # The key can fill the hole only if it does not move before its home bucket
+            home = self._hash(key)
+            if (b - home) % num_buckets >= (b - hole) % num_buckets:
+                table[hole] = key
+                if values is not None:
+                    values[hole] = values[b]
+                hole = b
+        table[hole] = self._empty
+        if values is not None:
+            values[hole] = self._values_empty()
+        return steps
+
+    def _rebuild(self):
+        """Insert all keys to a fresh table of the same size, dropping tombstones."""
+        old_table, old_values = self._table, self._values
+        self._table = self._empty_table(self._num_buckets)
+        if old_values is not None:
+            self._values = self._empty_values(self._num_buckets)
+        self._tombstones = 0
+        for i, key in enumerate(old_table):
+            if key != self._empty and key != self._deleted:
+                _, b, _ = self._probe(key, self._table, self._hash, self._num_buckets)
+                self._table[b] = key
+                if old_values is not None:
+                    self._values[b] = old_values[i]
+
+    def _grow(self):
+        """Double the table and start migrating keys to it."""
+        # Growing during a migration should not happen with our migrate
+        # step, but if it does, finish the previous migration first.
+        while self._old_table is not None:
+            self._migrate()
+
+        self._old_table = self._table
+        self._old_values = self._values
+        self._old_hash = self._hash
+        self._old_num_buckets = self._num_buckets
+        self._migrated = 0
+        self._setup(2 * self._num_buckets)
+
+    def _migrate(self):
+        """Move the next few buckets of the old table to the current one."""
+        if self._old_table is None:
+            return
+
+        steps = 0
+        end = min(self._migrated + self._migrate_step, self._old_num_buckets)
+        for i in range(self._migrated, end):
+            key = self._old_table[i]
+            if key != self._empty and key != self._deleted:
+                value = self._old_values[i] if self._old_values is not None else None
+                _, b, probe_steps = self._probe(key, self._table, self._hash, self._num_buckets)
+                steps += probe_steps + self._place(key, b, value)
+                self._size += 1
+        self._migrated = end
+        self._migration_steps += steps
+
+        if end == self._old_num_buckets:
+            self._old_table = self._old_values = self._old_hash = None
+
     def _update_counter(self, steps):
         self._ops += 1
         self._steps += steps
         self._max = max(self._max, steps)
+        if self._histogram is not None:
+            self._histogram[min(steps, HISTOGRAM_SIZE - 1)] += 1
 
     def reset_counter(self):
         self._steps = 0
         self._ops = 0
         self._max = 0
+        self._migration_steps = 0
+        self._histogram = array('Q', [0]) * HISTOGRAM_SIZE if self._with_histogram else None
 
     def report_avg(self): return self._steps / max(1, self._ops)
     def report_max(self): return self._max
+    def report_migration(self): return self._migration_steps / max(1, self._ops)
+    def report_histogram(self): return self._histogram
+    def report_percentile(self, fraction): return histogram_percentile(self._histogram, fraction)
+
+    def report_clusters(self):
+        """Return a dict mapping lengths of runs of used buckets to their counts.
+
+        Deleted buckets count as used, since probes pass through them too.
+        Only the current table is scanned during a migration.
+        """
+        if self._compact:
+            used = numpy.frombuffer(self._table, dtype=numpy.uint32) != EMPTY_U32
+        else:
+            used = numpy.fromiter((key is not None for key in self._table), dtype=bool, count=self._num_buckets)
+        empty = numpy.flatnonzero(~used)
+        if len(empty) == 0:
+            return {self._num_buckets: 1}
+
+        # Start at an empty bucket, so that no run wraps around the end
+        used = numpy.roll(used, -empty[0])
+        edges = numpy.diff(numpy.concatenate(([False], used, [False])).astype(numpy.int8))
+        lengths = numpy.flatnonzero(edges == -1) - numpy.flatnonzero(edges == 1)
+        values, counts = numpy.unique(lengths, return_counts=True)
+        return dict(zip(values.tolist(), counts.tolist()))
+
+class HashMap(HashTable):
+    """Hash table with linear probing, which maps keys to values.
+
+    Values are kept in an array parallel to the keys, so the probe which
+    finds a key finds its value too. Compact maps store values in a typed
+    array of 64-bit integers, so values must be unsigned 64-bit integers.
+    Options are the same as for HashTable.
+    """
+
+    _with_values = True
+
+    def get(self, key, default=None):
+        """Return the value of the key, or default if it is not present."""
+        self._migrate()
+        found, b, steps, old_b = self._find(key)
+        self._update_counter(steps)
+        if not found:
+            return default
+        return self._values[b] if old_b is None else self._old_values[old_b]
+
+    def put(self, key, value):
+        """Set the value of the key, adding the key if it is not present."""
+        self._check_key(key)
+        self._migrate()
+
+        found, b, steps, old_b = self._find(key)
+        if not found:
+            steps += self._add(key, b, value)
+        elif old_b is None:
+            self._values[b] = value
+        else:
+            # Not migrated yet, the migration will take the new value along
+            self._old_values[old_b] = value
+
+        self._update_counter(steps)
+
+    def pop(self, key, default=None):
+        """Remove the key and return its value, or default if it is not present."""
+        found, value = self._remove(key)
+        return value if found else default
+
+class CachedHashTable(HashTable):
+    """Hash table with linear probing whose buckets live in simulated memory.
+
+    Every access to a bucket goes through the given SimulatedCache, so its
+    statistics count cache misses caused by the table. Accesses to tables
+    of hash functions are not simulated.
+    """
+
+    def __init__(self, cache, *args, **kwargs):
+        self._cache = cache
+        HashTable.__init__(self, *args, **kwargs)
+
+    def _empty_table(self, num_buckets):
+        return CachedArray(HashTable._empty_table(self, num_buckets), self._cache)
+
+    def _empty_values(self, num_buckets):
+        return CachedArray(HashTable._empty_values(self, num_buckets), self._cache)
+
+# Description of the cuckoo table measured by the experiments and benchmarks
+CUCKOO_TABLE = "08/cuckoo_hash.py CuckooTable (fixed size, recursive rehash)"
+
+class CachedCuckooTable(CuckooTable):
+    """Cuckoo hash table whose buckets live in simulated memory, like CachedHashTable.
+
+    It wraps CuckooTable of cuckoo_hash.py in this directory, which keeps
+    a fixed number of buckets and rebuilds with fresh hash functions by
+    recursive inserts. The growing table of 07 is not measured here.
+    """
+
+    def __init__(self, cache, *args, **kwargs):
+        self._cache = cache
+        CuckooTable.__init__(self, *args, **kwargs)
+
+    def _empty_table(self):
+        return CachedArray(CuckooTable._empty_table(self), self._cache)
 
 def permute_list(l):
-    N = len(l)
-    for i in range(N - 1):
-        dst = i + (rng_next_u32() % (N-i))
-        l[i], l[dst] = l[dst], l[i]
+    """Shuffle the list in place.
+
+    The list is sorted by random 64-bit keys, which gives every order with
+    the same probability (ties are negligible), using no Python-level loop.
+    """
+    keys = rng_fill_u32(2 * len(l)).view(numpy.uint64)
+    order = numpy.argsort(keys, kind="stable")
+    l[:] = numpy.asarray(l)[order].tolist()
+
+def trial_seed(seed, *trial):
+    """Derive the seed of one trial from the seed of the whole experiment.
+
+    Every trial draws its hash functions and keys from its own seed,
+    so trials give the same results in any order and in any process.
+    """
+    name = "-".join(str(x) for x in (seed,) + trial)
+    return int.from_bytes(hashlib.blake2b(name.encode(), digest_size=8).digest(), "little")
+
+def run_trials(trial, tasks, jobs):
+    """Run trial for every task and yield the results in order of the tasks.
+
+    With jobs > 1, the trials run in a pool of that many processes.
+    """
+    if jobs <= 1:
+        yield from map(trial, tasks)
+        return
+    with multiprocessing.Pool(jobs) as pool:
+        yield from pool.imap(trial, tasks)
+
+def measure(H):
+    """Measurements of a table after one trial (or one step of it).
+
+    These are the average number of steps and, if the table keeps
+    a histogram, the histogram and the lengths of clusters.
+    """
+    if H.report_histogram() is None:
+        return H.report_avg(), None, None
+    return H.report_avg(), H.report_histogram(), H.report_clusters()
 
-def usage_test(hash_fun_factory, max_usage = 90, retry = 40):
-    avg = [0.0] * max_usage
-    avg2 = [0.0] * max_usage
+class Summary:
+    """Results of all trials of one line of experiment output.
 
+    Prints the average steps and their standard deviation over trials.
+    If the trials kept histograms, it also prints 50th, 99th and 99.9th
+    percentile of steps of all operations, and the average and maximum
+    length of clusters of used buckets.
+    """
+
+    def __init__(self):
+        self.trials = 0
+        self.avg = 0.0
+        self.avg2 = 0.0
+        self.histogram = None
+        self.clusters = {}
+
+    def add(self, measurements):
+        avg, histogram, clusters = measurements
+        self.trials += 1
+        self.avg += avg
+        self.avg2 += avg ** 2
+        if histogram is not None:
+            if self.histogram is None:
+                self.histogram = [0] * len(histogram)
+            for steps, ops in enumerate(histogram):
+                self.histogram[steps] += ops
+            for length, count in clusters.items():
+                self.clusters[length] = self.clusters.get(length, 0) + count
+
+    def print(self, label):
+        avg = self.avg / self.trials
+        avg2 = self.avg2 / self.trials
+        std_dev = sqrt(avg2 - avg**2)
+        line = "%i %.03f %.03f" % (label, avg, std_dev)
+
+        if self.histogram is not None:
+            percentiles = [histogram_percentile(self.histogram, f) for f in (0.5, 0.99, 0.999)]
+            num_clusters = sum(self.clusters.values())
+            cluster_avg = sum(l * c for l, c in self.clusters.items()) / max(1, num_clusters)
+            line += " %i %i %i %.03f %i" % (*percentiles, cluster_avg, max(self.clusters, default=0))
+        print(line)
+
+def usage_trial(hash_fun_factory, max_usage, rng, table_options, seed):
+    rng_init(seed, rng)
     N = 2**19
     step_size = N // 100
     elements = list(range(N))
-
-    for _ in range(retry):
-        H = HashTable(hash_fun_factory, N)
-        permute_list(elements)
-
+    H = HashTable(hash_fun_factory, N, **table_options)
+    permute_list(elements)
+
+    result = []
+    for s in range(max_usage):
+        H.reset_counter()
+        for i in range(step_size):
+            H.insert(s*step_size + i)
+        result.append(measure(H))
+    return result
+
+def usage_test(hash_fun_factory, max_usage = 90, retry = 40, seed = 0, rng = "random", jobs = 1,
+               **table_options):
+    summaries = [Summary() for _ in range(max_usage)]
+
+    trial = functools.partial(usage_trial, hash_fun_factory, max_usage, rng, table_options)
+    seeds = [trial_seed(seed, t) for t in range(retry)]
+    for result in run_trials(trial, seeds, jobs):
         for s in range(max_usage):
-            H.reset_counter()
-            for i in range(step_size):
-                H.insert(s*step_size + i)
-            avg[s] += H.report_avg()
-            avg2[s] += H.report_avg() ** 2
+            summaries[s].add(result[s])
 
     for i in range(max_usage):
-        avg[i] /= retry;
-        avg2[i] /= retry;
-        std_dev = sqrt(avg2[i] - avg[i]**2)
+        summaries[i].print(i + 1)
 
-        print("%i %.03f %.03f" % ((i + 1), avg[i], std_dev))
-
-def grow_test(hash_fun_factory, usage = 60, retry = 40, begin = 7, end = 21):
-    for n in range(begin, end):
-        avg = 0.0
-        avg2 = 0.0
-        N = 2 ** n
-        elements = list(range(N))
+def grow_trial(hash_fun_factory, usage, rng, table_options, task):
+    N, seed = task
+    rng_init(seed, rng)
+    elements = list(range(N))
+    H = HashTable(hash_fun_factory, N, **table_options)
+    permute_list(elements)
 
-        for _ in range(retry):
-            H = HashTable(hash_fun_factory, N)
-            permute_list(elements)
+    for x in elements[:N * usage // 100]:
+        H.insert(x)
 
-            for x in elements[:N * usage // 100]:
-                H.insert(x)
+    for i in range(N):
+        H.lookup(i)
 
-            for i in range(N):
-                H.lookup(i)
+    return measure(H)
 
-            avg += H.report_avg()
-            avg2 += H.report_avg() ** 2
+def grow_test(hash_fun_factory, usage = 60, retry = 40, begin = 7, end = 21, seed = 0, rng = "random", jobs = 1,
+              **table_options):
+    trial = functools.partial(grow_trial, hash_fun_factory, usage, rng, table_options)
+    # All sizes are in one stream of tasks, so that workers are not idle between sizes
+    tasks = [(2 ** n, trial_seed(seed, n, t)) for n in range(begin, end) for t in range(retry)]
+    results = run_trials(trial, tasks, jobs)
 
-        avg /= retry
-        avg2 /= retry
-        std_dev = sqrt(avg2 - avg**2)
+    for n in range(begin, end):
+        summary = Summary()
+        for _ in range(retry):
+            summary.add(next(results))
+        summary.print(2 ** n)
+
+def churn_trial(hash_fun_factory, usage, rounds, N, rng, table_options, seed):
+    rng_init(seed, rng)
+    n = N * usage // 100
+    elements = list(range(2 * N))
+
+    H = HashTable(hash_fun_factory, N, **table_options)
+    permute_list(elements)
+    present, absent = elements[:n], elements[n:]
+    for x in present:
+        H.insert(x)
+
+    result = []
+    for r in range(rounds):
+        # Replace n random keys by other ones
+        for _ in range(n):
+            i = rng_next_u32() % len(present)
+            j = rng_next_u32() % len(absent)
+            H.remove(present[i])
+            H.insert(absent[j])
+            present[i], absent[j] = absent[j], present[i]
+
+        H.reset_counter()
+        for i in range(N):
+            H.lookup(i)
+        result.append(measure(H))
+    return result
+
+def churn_test(hash_fun_factory, usage = 80, rounds = 10, retry = 5, N = 2**15, seed = 0, rng = "random", jobs = 1,
+               **table_options):
+    summaries = [Summary() for _ in range(rounds)]
+
+    trial = functools.partial(churn_trial, hash_fun_factory, usage, rounds, N, rng, table_options)
+    seeds = [trial_seed(seed, t) for t in range(retry)]
+    for result in run_trials(trial, seeds, jobs):
+        for r in range(rounds):
+            summaries[r].add(result[r])
+
+    for r in range(rounds):
+        summaries[r].print(r + 1)
+
+def cache_trial(hash_fun_factory, kind, max_usage, M, B, rng, table_options, seed):
+    rng_init(seed, rng)
+    N = 2**16
+    step_size = N // 100
+    samples = 1000
+    elements = list(range(2 * N))
+    permute_list(elements)
+    present, absent = elements[:N], elements[N:]
+
+    # Plenty of memory for tables allocated by rebuilds and growing
+    cache = SimulatedCache(64 * N, M, B)
+    if kind == "cuckoo":
+        H = CachedCuckooTable(cache, N, hash_factory=hash_fun_factory)
+    else:
+        H = CachedHashTable(cache, hash_fun_factory, N, **table_options)
+
+    result = []
+    for s in range(max_usage):
+        cache.reset_stats()
+        for x in present[s*step_size : (s+1)*step_size]:
+            H.insert(x)
+        insert_misses = cache.stat_cache_misses / step_size
+
+        hit_misses = []
+        for keys in [present[:(s+1)*step_size], absent]:
+            cache.reset_stats()
+            for _ in range(samples):
+                H.lookup(keys[rng_next_u32() % len(keys)])
+            hit_misses.append(cache.stat_cache_misses / samples)
+        result.append([insert_misses] + hit_misses)
+    return result
+
+def cache_test(hash_fun_factory, kind, max_usage = 45, retry = 5, M = 2**10, B = 8, seed = 0, rng = "random",
+               jobs = 1, **table_options):
+    """Print simulated cache misses per insert, successful and unsuccessful lookup.
+
+    Buckets are the units of memory, so with 8-byte buckets, the default
+    M and B correspond to 8 kB of cache in 64-byte lines. Cuckoo tables
+    are CachedCuckooTable, which take no table options and do not work
+    above 50% usage; a comment line naming the table precedes their output.
+    """
+    avg = [[0.0] * 3 for _ in range(max_usage)]
 
-        print("%i %.03f %.03f" % (N, avg, std_dev))
-
-tests = {
-    "usage-ms-low": lambda: usage_test(MultiplyShiftLowHash),
-    "usage-ms-high": lambda: usage_test(MultiplyShiftHighHash),
-    "usage-poly-1": lambda: usage_test(LinearHash),
-    "usage-poly-2": lambda: usage_test(QuadraticHash),
-    "usage-tab": lambda: usage_test(TabulationHash),
-
-    "grow-ms-low": lambda: grow_test(MultiplyShiftLowHash),
-    "grow-ms-high": lambda: grow_test(MultiplyShiftHighHash),
-    "grow-poly-1": lambda: grow_test(LinearHash),
-    "grow-poly-2": lambda: grow_test(QuadraticHash),
-    "grow-tab": lambda: grow_test(TabulationHash),
-}
-
-if len(sys.argv) == 3:
-    test, student_id = sys.argv[1], sys.argv[2]
-    rng_init(int(student_id))
-    if test in tests:
-        tests[test]()
+    trial = functools.partial(cache_trial, hash_fun_factory, kind, max_usage, M, B, rng, table_options)
+    seeds = [trial_seed(seed, t) for t in range(retry)]
+    for result in run_trials(trial, seeds, jobs):
+        for s in range(max_usage):
+            for i in range(3):
+                avg[s][i] += result[s][i]
+
+    if kind == "cuckoo":
+        print("# table: " + CUCKOO_TABLE)
+    for s in range(max_usage):
+        print("%i %.03f %.03f %.03f" % ((s + 1), *(x / retry for x in avg[s])))
+
+tests = {}
+for name, family in families.items():
+    tests["usage-" + name] = lambda family=family, **opts: usage_test(family, **opts)
+for name, family in families.items():
+    tests["grow-" + name] = lambda family=family, **opts: grow_test(family, **opts)
+for name, family in families.items():
+    for kind in ["linear", "cuckoo"]:
+        tests["cache-" + kind + "-" + name] = \
+            lambda family=family, kind=kind, **opts: cache_test(family, kind, **opts)
+tests["churn-ms-low"] = lambda **opts: churn_test(families["ms-low"], **opts)
+tests["churn-tab"] = lambda **opts: churn_test(families["tab"], **opts)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("test", help="one of: " + ", ".join(tests))
+    parser.add_argument("student_id", type=int)
+    parser.add_argument("--compact", action="store_true",
+                        help="store keys of hash tables in a typed 32-bit array")
+    parser.add_argument("--max-load", type=float, default=None,
+                        help="let hash tables grow when they are used more than this")
+    parser.add_argument("--deletion", choices=["shift", "tombstone"], default="shift",
+                        help="how hash tables remove keys")
+    parser.add_argument("--probing", choices=["linear", "robin_hood"], default="linear",
+                        help="how hash tables resolve collisions")
+    parser.add_argument("--histogram", action="store_true",
+                        help="also print percentiles of steps and average and maximum cluster length")
+    parser.add_argument("--rng", choices=sorted(rng_backends), default="random",
+                        help="random generator used by the experiments")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="run trials in this many processes; the output does not change")
+    args = parser.parse_args()
+
+    if args.test in tests:
+        tests[args.test](seed=args.student_id, rng=args.rng, jobs=args.jobs, compact=args.compact, max_load=args.max_load,
+                         deletion=args.deletion, probing=args.probing, histogram=args.histogram)
     else:
-        raise ValueError("Unknown test {}".format(test))
-else:
-    raise ValueError("Usage: {} <test> <student-id>".format(sys.argv[0]))
+        raise ValueError("Unknown test {}".format(args.test))
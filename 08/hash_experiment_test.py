@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+import contextlib, io, sys
+
+from hash_experiment import HashTable, HashMap, CachedHashTable, CachedCuckooTable, grow_test, churn_test, \
+    permute_list
+from cached_memory import SimulatedCache
+from hash_benchmark import run_benchmark
+from hash_functions import rng_init, rng_next_u32, rng_fill_u32, rng_backends, MultiplyShiftLowHash, MultiplyShiftHighHash, \
+    LinearHash, QuadraticHash, PolynomialHash, TabulationHash, TabulationHash64, CompactTabulationHash, Tabulation16Hash
+from cuckoo_hash import CuckooTable
+
+factories = [
+    ("ms-low", MultiplyShiftLowHash),
+    ("ms-high", MultiplyShiftHighHash),
+    ("poly-1", LinearHash),
+    ("poly-2", QuadraticHash),
+    ("poly-3", lambda num_buckets: PolynomialHash(num_buckets, 3)),
+    ("poly-2-small-prime", lambda num_buckets: PolynomialHash(num_buckets, 2, prime=1000003)),
+    ("tab", TabulationHash),
+    ("tab64", TabulationHash64),
+    ("tab-compact", CompactTabulationHash),
+    ("tab16", Tabulation16Hash),
+]
+
+def hash_many_test(n, num_buckets):
+    rng_init(42)
+    keys = [0, 1, 2**31, 2**32 - 1] + [rng_next_u32() for _ in range(n)]
+    for name, factory in factories:
+        h = factory(num_buckets)
+        buckets = h.hash_many(keys)
+        for key, bucket in zip(keys, buckets):
+            assert h(key) == bucket, \
+                "{}: bulk hash of {} differs from hashing a single key.".format(name, key)
+
+def compact_test(n, num_buckets):
+    results = []
+    for compact in [False, True]:
+        rng_init(42)
+        table = HashTable(TabulationHash, num_buckets, compact=compact)
+        keys = [rng_next_u32() >> 1 for _ in range(n)]
+        for key in keys:
+            table.insert(key)
+        found = [table.lookup(key) for key in keys] + [table.lookup(key + 2**31) for key in keys]
+        results.append((found, table.report_avg(), table.report_max()))
+
+    assert results[0] == results[1], "Compact table behaves differently from the list-based one."
+    assert all(results[0][0][:n]) and not any(results[0][0][n:]), "Lookup in the table returned a wrong result."
+
+class CheckedGrowTable(HashTable):
+    """A growing table which checks that migrations never overlap."""
+
+    def _grow(self):
+        assert self._old_table is None, "Table grew again before the migration finished."
+        HashTable._grow(self)
+
+def grow_table_test(n, max_load, hash_fun_factory):
+    rng_init(42)
+    table = CheckedGrowTable(hash_fun_factory, 2, max_load=max_load)
+    keys = [rng_next_u32() >> 1 for _ in range(n)]
+
+    old_table_hits = 0
+    for i, key in enumerate(keys):
+        table.insert(key)
+        if table._old_table is not None:
+            # Some keys are still only in the old table; look up all
+            # of them and insert some of them again.
+            for old_key in table._old_table[table._migrated:]:
+                if old_key is not None:
+                    assert table.lookup(old_key), "Key in the old table was not found."
+                    old_table_hits += 1
+            table.insert(keys[i // 2])
+        assert table.lookup(keys[i // 3]), "Key inserted before was not found."
+
+    assert old_table_hits > 0, "No lookup happened during a migration."
+    assert table._num_buckets * max_load >= n, "Table did not grow enough."
+    sizes = table._size + sum(1 for key in (table._old_table or [])[table._migrated:] if key is not None)
+    assert sizes == n, "Table contains {} keys instead of {}.".format(sizes, n)
+    for key in keys:
+        assert table.lookup(key), "Key not present in table, but it should be."
+        assert not table.lookup(key + 2**31), "Key present in table, even though it should not be."
+    assert table.report_migration() > 0, "Migration steps were not counted."
+
+def churn_size_test(n, num_buckets, rounds, **table_options):
+    rng_init(42)
+    table = HashTable(TabulationHash, num_buckets, **table_options)
+    present = [rng_next_u32() >> 1 for _ in range(n)]
+    for key in present:
+        table.insert(key)
+    for _ in range(rounds):
+        i = rng_next_u32() % n
+        table.remove(present[i])
+        present[i] = rng_next_u32() >> 1
+        table.insert(present[i])
+    assert table._num_buckets == num_buckets, \
+        "Table grew to {} buckets with the same number of keys.".format(table._num_buckets)
+    for key in present:
+        assert table.lookup(key), "Key not present in table after churn."
+
+def remove_test(n, num_buckets, **table_options):
+    rng_init(42)
+    table = HashTable(TabulationHash, num_buckets, **table_options)
+    fresh = HashTable(TabulationHash, num_buckets, **table_options)
+    fresh._hash = table._hash
+
+    keys = [rng_next_u32() >> 1 for _ in range(n)]
+    present = set()
+    for i, key in enumerate(keys):
+        table.insert(key)
+        present.add(key)
+        if i % 3 == 2:
+            # Remove one key present and one missing
+            removed = keys[rng_next_u32() % (i + 1)]
+            table.remove(removed)
+            table.remove(key + 2**31)
+            present.discard(removed)
+
+    for key in keys:
+        assert table.lookup(key) == (key in present), "Lookup after remove returned a wrong result."
+    for key in present:
+        fresh.insert(key)
+    if table_options.get("deletion", "shift") == "shift" and "max_load" not in table_options:
+        # Backward shift leaves the table as if removed keys were never inserted
+        used = lambda t: [key != t._empty for key in t._table]
+        assert used(table) == used(fresh), \
+            "Backward shift left different buckets used than inserting the remaining keys."
+        table.reset_counter(); fresh.reset_counter()
+        for key in keys:
+            table.lookup(key); fresh.lookup(key)
+        assert table.report_avg() == fresh.report_avg(), "Removing keys made probes longer."
+
+def robin_hood_test(n, num_buckets, **table_options):
+    rng_init(42)
+    table = HashTable(MultiplyShiftLowHash, num_buckets, probing="robin_hood", **table_options)
+    keys = [rng_next_u32() >> 1 for _ in range(n)]
+    for key in keys:
+        table.insert(key)
+    for key in keys[::2]:
+        table.remove(key)
+
+    for i, key in enumerate(keys):
+        assert table.lookup(key) == (i % 2 == 1), "Lookup in Robin Hood table returned a wrong result."
+        assert not table.lookup(key + 2**31), "Key present in table, even though it should not be."
+
+    # Keys of every run must be ordered by their home buckets
+    t, m, h = table._table, table._num_buckets, table._hash
+    for b in range(m):
+        c = (b + 1) % m
+        if t[b] is not None and t[c] is not None:
+            assert (c - h(t[c])) % m <= (b - h(t[b])) % m + 1, "Robin Hood order broken at bucket {}.".format(b)
+
+def map_test(n, num_buckets, **table_options):
+    rng_init(42)
+    table = HashMap(TabulationHash, num_buckets, **table_options)
+    gold = {}
+
+    keys = [rng_next_u32() % (2 * n) for _ in range(4 * n)]
+    for i, key in enumerate(keys):
+        op = rng_next_u32() % 4
+        if op == 0:
+            assert table.pop(key, -1) == gold.pop(key, -1), "Map popped a wrong value."
+        elif op == 1:
+            assert table.get(key, -1) == gold.get(key, -1), "Map returned a wrong value."
+        else:
+            table.put(key, i)
+            gold[key] = i
+
+    for key in range(2 * n):
+        assert table.get(key, -1) == gold.get(key, -1), "Map returned a wrong value."
+        assert table.lookup(key) == (key in gold), "Lookup in map returned a wrong result."
+
+def wide_keys_test(n, num_buckets):
+    rng_init(42)
+    table = HashMap(TabulationHash64, num_buckets)
+
+    # Keys differing only in the upper 32 bits, and strings
+    keys = [(i << 32) | 12345 for i in range(n)] + ["key-{}".format(i) for i in range(n)]
+    buckets = table._hash.hash_many(keys)
+    assert len(set(buckets.tolist())) > num_buckets // 2, "Wide keys collide too much."
+    for i, key in enumerate(keys):
+        assert table._hash(key) == buckets[i], "Bulk hash differs from hashing a single key."
+        table.put(key, i)
+
+    for i, key in enumerate(keys):
+        assert table.get(key) == i, "Map returned a wrong value."
+    for i in range(n):
+        assert not table.lookup((i << 32) | 12346), "Key present in table, even though it should not be."
+        assert not table.lookup("key-{}".format(i + n)), "Key present in table, even though it should not be."
+
+def cuckoo_test(n, num_buckets):
+    rng_init(42)
+    keys = list(set(rng_next_u32() >> 1 for _ in range(n)))
+    for name, factory in factories:
+        table = CuckooTable(num_buckets, hash_factory=factory)
+        for key in keys:
+            table.insert(key)
+        for key in keys:
+            assert table.lookup(key), "{}: key {} not found in the cuckoo table.".format(name, key)
+            assert not table.lookup(key + 2**31), "{}: missing key {} found in the cuckoo table.".format(name, key)
+
+def rng_test(n):
+    for backend in rng_backends:
+        draws = []
+        for _ in range(2):
+            rng_init(42, backend)
+            values = [rng_next_u32() for _ in range(n)] + rng_fill_u32(n).tolist()
+            permuted = list(range(n))
+            permute_list(permuted)
+            draws.append((values, permuted, TabulationHash(n).tables))
+        assert draws[0] == draws[1], "{}: the same seed gave different numbers.".format(backend)
+
+        values, permuted, _ = draws[0]
+        assert all(0 <= x < 2**32 for x in values), "{}: number out of 32 bits.".format(backend)
+        assert len(set(values)) > 2 * n - 10, "{}: too many repeated numbers.".format(backend)
+        assert sorted(permuted) == list(range(n)), "{}: permute_list lost or duplicated items.".format(backend)
+        assert permuted != list(range(n)), "{}: permute_list did not move anything.".format(backend)
+
+def histogram_test(n, num_buckets, **table_options):
+    rng_init(42)
+    table = HashTable(TabulationHash, num_buckets, histogram=True, **table_options)
+    keys = [rng_next_u32() >> 1 for _ in range(n)]
+    for key in keys:
+        table.insert(key)
+    for key in keys[:n // 4]:
+        table.remove(key)
+    for key in keys:
+        table.lookup(key)
+
+    histogram = table.report_histogram()
+    assert sum(histogram) == table._ops, "Histogram does not count every operation."
+    assert sum(steps * ops for steps, ops in enumerate(histogram)) == table._steps, \
+        "Histogram does not count every step."
+    p50, p99, p999 = [table.report_percentile(f) for f in (0.5, 0.99, 0.999)]
+    assert 1 <= p50 <= p99 <= p999 <= table.report_max(), "Percentiles are not ordered."
+
+    clusters = table.report_clusters()
+    used = sum(length * count for length, count in clusters.items())
+    assert used == table._size + table._tombstones, "Clusters do not cover all used buckets."
+
+def cache_test(n, num_buckets):
+    # Scanning memory sequentially misses once per block
+    cache = SimulatedCache(4 * num_buckets, 64, 8)
+    for addr in range(num_buckets):
+        cache.access(addr)
+    assert cache.stat_cache_misses == num_buckets // 8, "Sequential scan should miss once per block."
+    cache.reset_stats()
+    for addr in range(num_buckets - 64, num_buckets):
+        cache.access(addr)
+    assert cache.stat_cache_misses == 0, "Recently used blocks should stay cached."
+
+    for table_options in [{}, {"compact": True, "deletion": "tombstone"}, {"max_load": 0.7}]:
+        results = []
+        for cached in [False, True]:
+            rng_init(42)
+            if cached:
+                cache = SimulatedCache(64 * num_buckets, 64, 8)
+                table = CachedHashTable(cache, TabulationHash, num_buckets, **table_options)
+            else:
+                table = HashTable(TabulationHash, num_buckets, **table_options)
+            keys = [rng_next_u32() >> 1 for _ in range(n)]
+            for key in keys:
+                table.insert(key)
+            for key in keys[:n // 4]:
+                table.remove(key)
+            found = [table.lookup(key) for key in keys]
+            results.append((found, table.report_avg()))
+        assert results[0] == results[1], "Cached table behaves differently from the plain one."
+        assert 0 < cache.stat_cache_misses <= cache.stat_accesses, "Cached table did not use the cache."
+
+    cache = SimulatedCache(64 * num_buckets, 64, 8)
+    table = CachedCuckooTable(cache, num_buckets)
+    for key in keys:
+        table.insert(key)
+    assert all(table.lookup(key) for key in keys), "Key not found in the cached cuckoo table."
+    assert cache.stat_cache_misses > 0, "Cached cuckoo table did not use the cache."
+
+def benchmark_test():
+    report = run_benchmark(["linear", "cuckoo"], ["tab", "ms-low"], [2**10], [0.25, 0.9], 42, 100)
+    configs = [(r["table"], r["hash"], r["load"]) for r in report["results"]]
+    assert configs == [("linear", "tab", 0.25), ("linear", "tab", 0.9), ("linear", "ms-low", 0.25),
+                       ("linear", "ms-low", 0.9), ("cuckoo", "tab", 0.25), ("cuckoo", "ms-low", 0.25)], \
+        "Benchmark ran unexpected configurations."
+    for r in report["results"]:
+        assert sorted(r["ops"]) == ["insert", "lookup_hit", "lookup_miss"], "Benchmark missed an operation."
+        for op in r["ops"].values():
+            latency = op["latency_ns"]
+            assert op["ops_per_sec"] > 0, "Throughput must be positive."
+            assert 0 <= latency["p50"] <= latency["p90"] <= latency["p99"] <= latency["p99_9"], \
+                "Latency percentiles are not ordered."
+
+def parallel_test(jobs):
+    outputs = []
+    for j in [1, jobs]:
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            grow_test(LinearHash, retry=3, begin=7, end=10, seed=42, jobs=j)
+            churn_test(Tabulation16Hash, rounds=2, retry=3, N=2**10, seed=42, jobs=j, deletion="tombstone",
+                       histogram=True)
+        outputs.append(output.getvalue())
+    assert outputs[0] == outputs[1], "Parallel experiment printed different results than the serial one."
+
+# A list of all tests
+tests = [
+    ("hash_many_small", lambda: hash_many_test(10000, 2**10)),
+    ("hash_many_big",   lambda: hash_many_test(10000, 2**20)),
+    ("compact",         lambda: compact_test(3000, 2**12)),
+    ("grow_half",       lambda: grow_table_test(30000, 0.5, TabulationHash)),
+    ("grow_tight",      lambda: grow_table_test(30000, 0.9, MultiplyShiftLowHash)),
+    ("remove_shift",    lambda: remove_test(5000, 2**13)),
+    ("remove_compact",  lambda: remove_test(5000, 2**13, compact=True)),
+    ("remove_tomb",     lambda: remove_test(5000, 2**12, deletion="tombstone")),
+    ("remove_grow",     lambda: remove_test(20000, 4, max_load=0.7)),
+    ("remove_grow_tomb",lambda: remove_test(20000, 4, max_load=0.7, deletion="tombstone")),
+    ("churn_size",      lambda: churn_size_test(400, 1024, 20000, max_load=0.5)),
+    ("churn_size_tomb", lambda: churn_size_test(400, 1024, 20000, max_load=0.5, deletion="tombstone")),
+    ("remove_robin",    lambda: remove_test(5000, 2**13, probing="robin_hood")),
+    ("robin_hood",      lambda: robin_hood_test(7000, 2**13)),
+    ("robin_hood_grow", lambda: robin_hood_test(7000, 4, max_load=0.9)),
+    ("map",             lambda: map_test(5000, 2**13)),
+    ("wide_keys",       lambda: wide_keys_test(3000, 2**13)),
+    ("map_compact",     lambda: map_test(5000, 2**13, compact=True)),
+    ("map_tomb",        lambda: map_test(5000, 2**13, deletion="tombstone")),
+    ("map_robin",       lambda: map_test(5000, 2**13, probing="robin_hood")),
+    ("map_grow",        lambda: map_test(5000, 2, max_load=0.8)),
+    ("map_grow_tomb",   lambda: map_test(5000, 2, max_load=0.8, deletion="tombstone")),
+    ("cuckoo",          lambda: cuckoo_test(2000, 2**13)),
+    ("parallel",        lambda: parallel_test(3)),
+    ("rng",             lambda: rng_test(10000)),
+    ("histogram",       lambda: histogram_test(3000, 4096)),
+    ("cache",           lambda: cache_test(1000, 4096)),
+    ("benchmark",       benchmark_test),
+    ("histogram_compact", lambda: histogram_test(3000, 4096, compact=True, deletion="tombstone")),
+]
+
+if __name__ == "__main__":
+    for required_test in sys.argv[1:] or [name for name, _ in tests]:
+        for name, test in tests:
+            if name == required_test:
+                print("Running test {}".format(name), file=sys.stderr)
+                test()
+                break
+        else:
+            raise ValueError("Unknown test {}".format(name))
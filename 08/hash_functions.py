@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+
+"""Families of hash functions shared by HashTable and CuckooTable.
+
+Every family is a factory taking the number of buckets and returning
+a freshly drawn hash function. The function maps keys to buckets when
+called (as HashTable does) or by its hash method (as CuckooTable does),
+and hashes a whole array of keys by hash_many.
+"""
+
+import functools, hashlib, random
+from array import array
+
+import numpy
+
+class PythonRng:
+    """Random generator backed by the random module (Mersenne Twister)."""
+
+    def __init__(self, seed):
+        self._random = random.Random(seed)
+
+    def next_u32(self):
+        return self._random.getrandbits(32)
+
+    def fill_u32(self, n):
+        # One big number of 32n bits is cut to n words, all drawn in C
+        data = self._random.getrandbits(32 * n).to_bytes(4 * n, "little")
+        return numpy.frombuffer(data, dtype=numpy.uint32).copy()
+
+class NumpyRng:
+    """Random generator backed by numpy's PCG64.
+
+    Single values are drawn from numpy in blocks, since drawing them
+    one by one costs more than the values are worth.
+    """
+
+    block_size = 4096
+
+    def __init__(self, seed):
+        self._generator = numpy.random.Generator(numpy.random.PCG64(seed))
+        self._block = []
+
+    def next_u32(self):
+        if not self._block:
+            self._block = self.fill_u32(self.block_size).tolist()
+            self._block.reverse()
+        return self._block.pop()
+
+    def fill_u32(self, n):
+        return self._generator.integers(0, 2**32, size=n, dtype=numpy.uint32)
+
+rng_backends = {
+    "random": PythonRng,
+    "numpy": NumpyRng,
+}
+
+# Our wrapper of random so we can substitute it with another random generator
+_rng = PythonRng(None)
+
+def rng_init(seed, backend="random"):
+    """Start a new stream of random numbers given by the seed and the backend."""
+    global _rng
+    _rng = rng_backends[backend](seed)
+
+def rng_next_u32():
+    return _rng.next_u32()
+
+def rng_fill_u32(n):
+    """Return a numpy array of n random 32-bit numbers."""
+    return _rng.fill_u32(n)
+
+def as_u32_array(keys):
+    """View a list, buffer or numpy array of keys as a numpy array of uint32."""
+    return numpy.asarray(keys, dtype=numpy.uint32)
+
+class TabulationHash:
+    """Hash function for hashing by tabulation.
+
+    The 32-bit key is split to four 8-bit parts. Each part indexes
+    a separate table of 256 randomly generated values. Obtained values
+    are XORed together.
+    """
+
+    def __init__(self, num_buckets):
+        self.num_buckets = num_buckets
+        self.np_tables = rng_fill_u32(4 * 256).reshape(4, 256)
+        self.tables = self.np_tables.tolist()
+
+    def __call__(self, key):
+        h0 = key & 0xff;
+        h1 = (key >> 8) & 0xff;
+        h2 = (key >> 16) & 0xff;
+        h3 = (key >> 24) & 0xff;
+        t = self.tables
+        return (t[0][h0] ^ t[1][h1] ^ t[2][h2] ^ t[3][h3]) % self.num_buckets
+
+    hash = __call__
+
+    def hash_many(self, keys):
+        """Hash a whole array (or buffer) of 32-bit keys at once.
+
+        Returns a numpy array of buckets, equal to calling the hash on each key.
+        """
+        keys = as_u32_array(keys)
+        t = self.np_tables
+        h = t[0][keys & 0xff] ^ t[1][(keys >> 8) & 0xff] ^ \
+            t[2][(keys >> 16) & 0xff] ^ t[3][keys >> 24]
+        return h % self.num_buckets
+
+class CompactTabulationHash:
+    """Hash function for hashing by tabulation with flat tables.
+
+    Works like TabulationHash, but all tables are stored one after another
+    in a single array of 32-bit integers. With chunk_bits=16, the 32-bit key
+    is split to two 16-bit parts, so only two tables (512 kB together)
+    are looked up instead of four.
+    """
+
+    def __init__(self, num_buckets, chunk_bits=8):
+        assert chunk_bits in (8, 16), "CompactTabulationHash: chunks must have 8 or 16 bits"
+        self.num_buckets = num_buckets
+        self.chunk_bits = chunk_bits
+        self.num_chunks = 32 // chunk_bits
+        self.table = array('I', rng_fill_u32(self.num_chunks << chunk_bits).tobytes())
+        # Pick the hashing method once, not on every call
+        self._hash = self._hash16 if chunk_bits == 16 else self._hash8
+
+    def __call__(self, key):
+        return self._hash(key)
+
+    hash = __call__
+
+    def _hash8(self, key):
+        t = self.table
+        return (t[key & 0xff] ^ t[0x100 + ((key >> 8) & 0xff)] ^
+                t[0x200 + ((key >> 16) & 0xff)] ^ t[0x300 + ((key >> 24) & 0xff)]) % self.num_buckets
+
+    def _hash16(self, key):
+        t = self.table
+        return (t[key & 0xffff] ^ t[0x10000 + ((key >> 16) & 0xffff)]) % self.num_buckets
+
+    def hash_many(self, keys):
+        """Hash a whole array (or buffer) of 32-bit keys at once.
+
+        Returns a numpy array of buckets, equal to calling the hash on each key.
+        """
+        # A view of the same memory, no copy is made
+        t = numpy.frombuffer(self.table, dtype=numpy.uint32)
+        keys = as_u32_array(keys)
+        bits, mask = self.chunk_bits, (1 << self.chunk_bits) - 1
+        h = t[keys & mask]
+        for i in range(1, self.num_chunks):
+            h ^= t[(i << bits) + ((keys >> (i * bits)) & mask)]
+        return h % self.num_buckets
+
+# Partial applications rather than lambdas, so that they can be passed to worker processes
+Tabulation16Hash = functools.partial(CompactTabulationHash, chunk_bits=16)
+
+def prehash(key):
+    """Turn a str or bytes key to a 64-bit integer by BLAKE2, keep integers."""
+    if isinstance(key, str):
+        key = key.encode()
+    if isinstance(key, bytes):
+        return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+    return key
+
+class TabulationHash64:
+    """Hash function for hashing 64-bit keys by tabulation.
+
+    The 64-bit key is split to eight 8-bit parts, each indexing its own
+    table of 256 random values. Keys of type str or bytes are first
+    turned to 64-bit integers by `prehash`.
+    """
+
+    def __init__(self, num_buckets):
+        self.num_buckets = num_buckets
+        self.np_tables = rng_fill_u32(8 * 256).reshape(8, 256)
+        self.tables = self.np_tables.tolist()
+
+    def __call__(self, key):
+        key = prehash(key)
+        t = self.tables
+        return (t[0][key & 0xff] ^ t[1][(key >> 8) & 0xff] ^
+                t[2][(key >> 16) & 0xff] ^ t[3][(key >> 24) & 0xff] ^
+                t[4][(key >> 32) & 0xff] ^ t[5][(key >> 40) & 0xff] ^
+                t[6][(key >> 48) & 0xff] ^ t[7][(key >> 56) & 0xff]) % self.num_buckets
+
+    hash = __call__
+
+    def hash_many(self, keys):
+        """Hash a whole array (or buffer) of 64-bit keys at once.
+
+        A list may contain str or bytes keys too. Returns a numpy array
+        of buckets, equal to calling the hash on each key.
+        """
+        if not isinstance(keys, numpy.ndarray):
+            keys = [prehash(key) for key in keys]
+        keys = numpy.asarray(keys, dtype=numpy.uint64)
+        t = self.np_tables
+        h = t[0][keys & 0xff]
+        for i in range(1, 8):
+            h ^= t[i][(keys >> (8*i)) & 0xff]
+        return h % self.num_buckets
+
+class PolynomialHash:
+    """Hash function using polynomial modulo a prime."""
+
+    def __init__(self, num_buckets, degree, prime = 2147483647):
+        self.num_buckets = num_buckets
+        self.prime = prime
+        self.coefs = [ rng_next_u32() for _ in range(degree + 1) ]
+        # Linear and quadratic hashes are evaluated without a loop
+        self._hash = {1: self._hash1, 2: self._hash2}.get(degree, self._hash_any)
+
+    def __call__(self, key):
+        return self._hash(key)
+
+    hash = __call__
+
+    def _hash_any(self, key):
+        acc = 0
+        for c in self.coefs:
+            acc = (acc * key + c) % self.prime
+        return acc % self.num_buckets
+
+    def _hash1(self, key):
+        c0, c1 = self.coefs
+        return (c0 * key + c1) % self.prime % self.num_buckets
+
+    def _hash2(self, key):
+        c0, c1, c2 = self.coefs
+        p = self.prime
+        return ((c0 * key + c1) % p * key + c2) % p % self.num_buckets
+
+    def hash_many(self, keys):
+        """Hash a whole array (or buffer) of 32-bit keys at once.
+
+        Returns a numpy array of buckets, equal to calling the hash on each key.
+        """
+        # acc * key + c fits in 64 bits only for primes below 2^31
+        assert self.prime < 2**31, "PolynomialHash: hash_many needs prime < 2^31"
+        keys = as_u32_array(keys).astype(numpy.uint64)
+        p = numpy.uint64(self.prime)
+        # Horner's rule in place, without temporary arrays; numpy divides
+        # by a constant using multiplication, which is faster than folding
+        # bits for the Mersenne prime.
+        acc = numpy.full(len(keys), self.coefs[0] % self.prime, dtype=numpy.uint64)
+        for c in self.coefs[1:]:
+            acc *= keys
+            acc += numpy.uint64(c)
+            numpy.remainder(acc, p, out=acc)
+        return acc % numpy.uint64(self.num_buckets)
+
+LinearHash = functools.partial(PolynomialHash, degree=1)
+QuadraticHash = functools.partial(PolynomialHash, degree=2)
+
+class MultiplyShiftLowHash:
+    """Multiply-shift hash function taking top bits of 32-bit word"""
+
+    def __init__(self, num_buckets):
+        self.mask = num_buckets - 1
+        assert (num_buckets & self.mask == 0), \
+            "MultiplyShiftLowHash: num_buckets must be power of 2"
+
+        self.mult = rng_next_u32() | 0x1
+        self.shift = 0;
+        tmp = num_buckets - 1
+        while 0x80000000 & tmp == 0:
+            tmp <<= 1
+            self.shift += 1
+
+    def __call__(self, key):
+        return ((key * self.mult) >> self.shift) & self.mask
+
+    hash = __call__
+
+    def hash_many(self, keys):
+        """Hash a whole array (or buffer) of 32-bit keys at once.
+
+        Returns a numpy array of buckets, equal to calling the hash on each key.
+        """
+        # Only the low 32 bits of the product are used, so wrapping is fine
+        keys = as_u32_array(keys)
+        return ((keys * numpy.uint32(self.mult)) >> numpy.uint32(self.shift)) & numpy.uint32(self.mask)
+
+class MultiplyShiftHighHash:
+    """Multiply-shift hash function taking low bits of upper half of 64-bit word"""
+
+    def __init__(self, num_buckets):
+        self.mask = num_buckets - 1
+        assert (num_buckets & self.mask == 0), \
+            "MultiplyShiftLowHash: num_buckets must be power of 2"
+        self.mult = (rng_next_u32() << 32) | rng_next_u32() | 0x1
+
+    def __call__(self, key):
+        return ((key * self.mult) >> 32) & self.mask
+
+    hash = __call__
+
+    def hash_many(self, keys):
+        """Hash a whole array (or buffer) of 32-bit keys at once.
+
+        Returns a numpy array of buckets, equal to calling the hash on each key.
+        """
+        # Only the low 64 bits of the product are used, so wrapping is fine
+        keys = as_u32_array(keys).astype(numpy.uint64)
+        return ((keys * numpy.uint64(self.mult)) >> numpy.uint64(32)) & numpy.uint64(self.mask)
+
+# Families by their names used in experiments
+families = {
+    "ms-low": MultiplyShiftLowHash,
+    "ms-high": MultiplyShiftHighHash,
+    "poly-1": LinearHash,
+    "poly-2": QuadraticHash,
+    "tab": TabulationHash,
+    "tab64": TabulationHash64,
+    "tab16": Tabulation16Hash,
+}